@@ -1,50 +1,83 @@
-import os
+import time
 from flask import Flask
+from jinja2 import FileSystemBytecodeCache
 from config import Config
 from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_login import LoginManager
-import logging
-from logging.handlers import SMTPHandler, RotatingFileHandler
 from flask_mail import Mail
+from app.database import RoutingSession, configure_engines, \
+    dispose_engines_after_fork
+from app.logs import configure_logging
 
 
-app = Flask(__name__)
-app.config.from_object(Config)
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
-login = LoginManager(app)
-mail = Mail(app)
-login.login_view = 'login'
-
-
-if not app.debug:
-    if app.config['MAIL_SERVER']:
-        auth = None
-        if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
-            auth = (app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
-        secure = None
-        if app.config['MAIL_USE_TLS']:
-            secure = ()
-        mail_handler = SMTPHandler(
-            mailhost=(app.config['MAIL_SERVER'], app.config['MAIL_PORT']),
-            fromaddr='no-reply@' + app.config['MAIL_SERVER'],
-            toaddrs=app.config['ADMINS'], subject='TechBlog Failure',
-            credentials=auth, secure=secure
-        )
-        mail_handler.setLevel(logging.ERROR)
-        app.logger.addHandler(mail_handler)
-
-    if not os.path.exists('logs'):
-        os.mkdir('logs')
-    file_handler = RotatingFileHandler('logs/techblog.log', maxBytes=10240,
-                                       backupCount=10)
-    file_handler.setFormatter(logging.Formatter(
-        '%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]'))
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-
-    app.logger.setLevel(logging.INFO)
-    app.logger.info('TechBlog`s startup')
-
-from app import routes, models, errors
\ No newline at end of file
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+migrate = Migrate()
+login = LoginManager()
+login.login_view = 'auth.login'
+mail = Mail()
+
+
+def create_app(config_class=Config):
+    """Builds and configures an instance of the app.
+    The time this takes is logged and exported on /metrics"""
+    started = time.perf_counter()
+    app = Flask(__name__)
+    app.config.from_object(config_class)
+    if app.config['JINJA_BYTECODE_CACHE_DIR']:
+        app.jinja_options = dict(
+            app.jinja_options, bytecode_cache=FileSystemBytecodeCache(
+                app.config['JINJA_BYTECODE_CACHE_DIR']))
+
+    db.init_app(app)
+    configure_engines(app, db)
+    dispose_engines_after_fork(app, db)
+    migrate.init_app(app, db)
+    login.init_app(app)
+    mail.init_app(app)
+
+    # each app gets its own instances, found through `current_app`
+    from app.passwords import PasswordHasher
+    PasswordHasher(app)
+    from app.email import MailQueue
+    MailQueue(app)
+    from app.last_seen import LastSeenBuffer
+    LastSeenBuffer(app)
+    from app.fragments import FragmentCache
+    FragmentCache(app)
+    from app.user_cache import UserCache
+    UserCache(app)
+    from app.usernames import UsernameIndex
+    UsernameIndex(app)
+    from app.metrics import Metrics
+    Metrics(app)
+    from app.events import TimelineEvents
+    TimelineEvents(app)
+    from app.compress import Compression
+    Compression(app)
+
+    from app.errors import bp as errors_bp
+    app.register_blueprint(errors_bp)
+
+    from app.auth import bp as auth_bp
+    app.register_blueprint(auth_bp)
+
+    from app.main import bp as main_bp
+    app.register_blueprint(main_bp)
+
+    from app.api import bp as api_bp
+    app.register_blueprint(api_bp, url_prefix='/api')
+
+    from app.cli import bp as cli_bp
+    app.register_blueprint(cli_bp)
+
+    if not app.debug and not app.testing:
+        configure_logging(app)
+
+    app.startup_time = time.perf_counter() - started
+    if not app.debug and not app.testing:
+        app.logger.info('TechBlog`s startup (%.3fs)', app.startup_time)
+    return app
+
+
+from app import models
@@ -0,0 +1,197 @@
+import json
+from functools import wraps
+import sqlalchemy as sa
+from flask import request, g, Response, stream_with_context, url_for, \
+    current_app
+from werkzeug.http import HTTP_STATUS_CODES
+from app import db
+from app.api import bp
+from app.models import User, Post, ArchivedPost, with_authors
+from app.pagination import KeysetPagination
+
+
+def error_response(status_code, message=None):
+    """Returns a JSON error payload for the API"""
+    payload = {'error': HTTP_STATUS_CODES.get(status_code, 'Unknown error')}
+    if message:
+        payload['message'] = message
+    return payload, status_code
+
+
+def token_required(f):
+    """Authenticates a request with an `Authorization: Bearer` token"""
+    @wraps(f)
+    def decorated_view(*args, **kwargs):
+        auth = request.headers.get('Authorization', '')
+        scheme, _, token = auth.partition(' ')
+        user = User.verify_api_token(token) \
+            if scheme.lower() == 'bearer' else None
+        if user is None:
+            return error_response(401)
+        g.api_user = user
+        return f(*args, **kwargs)
+    return decorated_view
+
+
+def requested_fields():
+    """Parses the `fields` argument, e.g. ?fields=id,body"""
+    fields = request.args.get('fields')
+    if not fields:
+        return Post.API_FIELDS
+    return tuple(field for field in fields.split(',')
+                 if field in Post.API_FIELDS)
+
+
+def posts_response(query, keys, endpoint, tiers=(), **values):
+    """Streams one cursor-paginated page of Posts as JSON, continuing
+    into the (query, keys) pairs of `tiers`, e.g. ArchivedPosts.
+    The page is serialized post by post, so large pages are never held
+    in memory as one JSON document"""
+    fields = requested_fields()
+    if 'author' in fields or 'author_avatar' in fields:
+        query = with_authors(query)
+        tiers = [(with_authors(tier_query), tier_keys)
+                 for tier_query, tier_keys in tiers]
+    config = current_app.config
+    limit = min(request.args.get('limit', config['POSTS_PER_PAGE'], type=int),
+                config['API_MAX_PER_PAGE'])
+    posts = KeysetPagination(query, keys, request.args.get('cursor'),
+                             max(limit, 1), tiers=tiers)
+    if request.args.get('fields'):
+        values['fields'] = request.args['fields']
+    links = {
+        'next': url_for(endpoint, cursor=posts.next_cursor, limit=limit,
+                        **values) if posts.next_cursor else None,
+        'prev': url_for(endpoint, cursor=posts.prev_cursor, limit=limit,
+                        **values) if posts.prev_cursor else None,
+    }
+
+    def generate():
+        yield '{"items": ['
+        for i, post in enumerate(posts.items):
+            yield (',' if i else '') + json.dumps(post.to_dict(fields))
+        yield '], "next_cursor": {}, "prev_cursor": {}, "_links": {}}}'.format(
+            json.dumps(posts.next_cursor), json.dumps(posts.prev_cursor),
+            json.dumps(links))
+
+    return Response(stream_with_context(generate()),
+                    mimetype='application/json')
+
+
+@bp.route('/tokens', methods=['POST'])
+def api_get_token():
+    """Exchanges HTTP Basic credentials for an API bearer token"""
+    auth = request.authorization
+    if auth is None or auth.type != 'basic':
+        return error_response(401)
+    user = db.session.scalar(
+        sa.select(User).where(User.username == auth.username))
+    if user is None or not user.check_password(auth.password):
+        return error_response(401)
+    expires_in = current_app.config['API_TOKEN_EXPIRATION']
+    return {'token': user.get_api_token(expires_in),
+            'expires_in': expires_in}
+
+
+@bp.route('/timeline')
+@token_required
+def api_timeline():
+    """The authenticated User's home timeline"""
+    (query, keys), *tiers = g.api_user.timeline_tiers()
+    return posts_response(query, keys, 'api.api_timeline', tiers=tiers)
+
+
+@bp.route('/explore')
+@token_required
+def api_explore():
+    """Every Post, newest first"""
+    return posts_response(sa.select(Post), (Post.timestamp, Post.id),
+                          'api.api_explore',
+                          tiers=[(sa.select(ArchivedPost),
+                                  (ArchivedPost.timestamp, ArchivedPost.id))])
+
+
+@bp.route('/users/<username>/posts')
+@token_required
+def api_user_posts(username):
+    """A User's own Posts, newest first"""
+    user = db.session.scalar(sa.select(User).where(User.username == username))
+    if user is None:
+        return error_response(404)
+    archived = sa.select(ArchivedPost).where(ArchivedPost.user_id == user.id)
+    return posts_response(user.posts.select(), (Post.timestamp, Post.id),
+                          'api.api_user_posts',
+                          tiers=[(archived,
+                                  (ArchivedPost.timestamp, ArchivedPost.id))],
+                          username=username)
+
+
+def change_follows(usernames, unfollow=False):
+    """Follows, or unfollows, `usernames` for the API User with one
+    query to resolve them and one set-based write.
+    Returns the usernames changed, those that do not exist and the API
+    User's own, which is skipped"""
+    user = g.api_user
+    skipped = [user.username] if user.username in usernames else []
+    ids = User.ids_for_usernames(set(usernames) - set(skipped))
+    if unfollow:
+        changed = user.unfollow_ids(ids.values())
+    else:
+        changed = user.follow_ids(ids.values())
+    db.session.commit()
+    names = {id: username for username, id in ids.items()}
+    return sorted(names[id] for id in changed), \
+        sorted(set(usernames) - ids.keys() - set(skipped)), skipped
+
+
+def bulk_follows_response(unfollow=False):
+    """Applies a `{"usernames": [...]}` bulk follow or unfollow request"""
+    data = request.get_json(silent=True)
+    usernames = data.get('usernames') if isinstance(data, dict) else None
+    limit = current_app.config['API_MAX_FOLLOWS']
+    if not isinstance(usernames, list) or len(usernames) > limit or \
+            not all(isinstance(username, str) for username in usernames):
+        return error_response(
+            400, f'Expected {{"usernames": [...]}} of at most {limit} names')
+    changed, not_found, skipped = change_follows(usernames, unfollow)
+    return {'unfollowed' if unfollow else 'followed': changed,
+            'not_found': not_found, 'skipped': skipped}
+
+
+@bp.route('/follow', methods=['POST'])
+@token_required
+def api_follow():
+    """Follows a list of Users, e.g. an imported contact list"""
+    return bulk_follows_response()
+
+
+@bp.route('/unfollow', methods=['POST'])
+@token_required
+def api_unfollow():
+    """Unfollows a list of Users"""
+    return bulk_follows_response(unfollow=True)
+
+
+@bp.route('/users/<username>/follow', methods=['POST'])
+@token_required
+def api_follow_user(username):
+    """Follows one User"""
+    followed, not_found, skipped = change_follows([username])
+    if not_found:
+        return error_response(404)
+    if skipped:
+        return error_response(400, 'You cannot follow yourself')
+    return {'followed': followed, 'not_found': []}
+
+
+@bp.route('/users/<username>/unfollow', methods=['POST'])
+@token_required
+def api_unfollow_user(username):
+    """Unfollows one User"""
+    unfollowed, not_found, skipped = change_follows([username],
+                                                    unfollow=True)
+    if not_found:
+        return error_response(404)
+    if skipped:
+        return error_response(400, 'You cannot unfollow yourself')
+    return {'unfollowed': unfollowed, 'not_found': []}
@@ -0,0 +1,60 @@
+import sqlalchemy as sa
+from app import db
+from app.data import Progress
+from app.models import Post, ArchivedPost, timeline
+
+ARCHIVE_COLUMNS = ('id', 'body', 'timestamp', 'user_id')
+
+
+def archive_posts(before, batch_size=1000, report=print):
+    """Moves Posts written before `before` from `post` to `post_archive`,
+    oldest first, `batch_size` Posts per transaction so that writers
+    are never locked out for long. Their materialized timeline entries
+    go with them, and the FTS5 triggers move their full-text index rows
+    to `post_archive_fts`. Returns the Posts moved"""
+    progress = Progress(report, batch_size * 10)
+    while True:
+        ids = db.session.scalars(
+            sa.select(Post.id).where(Post.timestamp < before)
+            .order_by(Post.timestamp, Post.id).limit(batch_size)).all()
+        if not ids:
+            break
+        db.session.execute(
+            sa.insert(ArchivedPost.__table__).from_select(
+                ARCHIVE_COLUMNS,
+                sa.select(*[Post.__table__.c[column]
+                            for column in ARCHIVE_COLUMNS])
+                .where(Post.id.in_(ids))))
+        db.session.execute(
+            sa.delete(timeline).where(timeline.c.post_id.in_(ids)))
+        db.session.execute(
+            sa.delete(Post).where(Post.id.in_(ids))
+            .execution_options(synchronize_session=False))
+        db.session.commit()
+        progress.add(len(ids))
+    progress.show()
+    return progress.rows
+
+
+def optimize_tables(vacuum=True, report=print):
+    """Refreshes the planner statistics of `post` and `post_archive` and,
+    with `vacuum`, returns the pages freed by archiving to the OS.
+    Supports SQLite and PostgreSQL"""
+    db.session.close()
+    tables = (Post.__tablename__, ArchivedPost.__tablename__)
+    dialect = db.engine.dialect.name
+    if dialect not in ('sqlite', 'postgresql'):
+        report(f'No maintenance for {dialect}, skipped.')
+        return
+    # VACUUM cannot run inside a transaction
+    with db.engine.connect().execution_options(
+            isolation_level='AUTOCOMMIT') as conn:
+        for table in tables:
+            if dialect == 'postgresql' and vacuum:
+                conn.exec_driver_sql(f'VACUUM ANALYZE {table}')
+            else:
+                conn.exec_driver_sql(f'ANALYZE {table}')
+        report('Analyzed ' + ', '.join(tables) + '.')
+        if dialect == 'sqlite' and vacuum:
+            conn.exec_driver_sql('VACUUM')
+            report('Vacuumed the database.')
@@ -0,0 +1,109 @@
+from urllib.parse import urlsplit
+from flask import render_template, flash, redirect, url_for, request
+from flask_login import current_user, login_user, logout_user
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.auth import bp
+from app.forms import LoginForm, RegistrationForm, ResetPasswordRequestForm, \
+    ResetPasswordForm
+from app.models import User
+from app.email import send_password_reset_email
+from app.usernames import username_index, username_taken
+
+
+@bp.route('/login', methods=['GET', 'POST'])
+def login():
+    """logs In a User by Verification"""
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    form = LoginForm()
+    if form.validate_on_submit():
+        user = db.session.scalar(
+            sa.select(User).where(User.username == form.username.data))
+        if user is None or not user.check_password(form.password.data):
+            flash('Invalid username or password')
+            return redirect(url_for('auth.login'))
+        if user.password_needs_rehash():
+            user.set_password(form.password.data)
+            db.session.commit()
+        login_user(user, remember=form.remember_me.data)
+        next_page = request.args.get('next')
+        if not next_page or urlsplit(next_page).netloc != '':
+            next_page = url_for('main.index')
+        return redirect(next_page)
+    return render_template('login.html', title='Sign In', form=form)
+
+
+@bp.route('/logout')
+def logout():
+    """Logs out an Active User"""
+    logout_user()
+    return redirect(url_for('main.index'))
+
+
+@bp.route('/register', methods=['GET', 'POST'])
+def register():
+    """Route to Register a new User.
+    Saves a User Information from form into the app Instance DB"""
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    form = RegistrationForm()
+    if form.validate_on_submit():
+        user = User(username=form.username.data, email=form.email.data)
+        user.set_password(form.password.data)
+        db.session.add(user)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # taken by another worker since the index last loaded
+            db.session.rollback()
+            flash('Please use a different username or email address.')
+            return render_template('register.html', title='Register',
+                                   form=form)
+        username_index.add(user)
+        flash('Congratulations, you are now a registered user!')
+        return redirect(url_for('auth.login'))
+    return render_template('register.html', title='Register', form=form)
+
+
+@bp.route('/username_available')
+def username_available():
+    """Checks whether a username is free to register, as JSON"""
+    username = request.args.get('username', '').strip()
+    if not username:
+        return {'error': 'Bad Request',
+                'message': 'username is required'}, 400
+    return {'username': username, 'available': not username_taken(username)}
+
+
+@bp.route('/reset_password_request', methods=['GET','POST'])
+def reset_password_request():
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    form = ResetPasswordRequestForm()
+    if form.validate_on_submit():
+        user = db.session.scalar(
+            sa.select(User).where(User.email == form.email.data))
+        if user:
+            send_password_reset_email(user)
+        flash('Check your Email for Instructions to reset your Password.')
+        return redirect(url_for('auth.login'))
+    return render_template('reset_password_request.html',
+                           title='Reset Password', form=form)
+
+
+@bp.route('/reset_password/<token>', methods=['GET', 'POST'])
+def reset_password(token):
+    if current_user.is_authenticated:
+        return redirect(url_for('main.index'))
+    user = User.verify_reset_password_token(token)
+    if not user:
+        return redirect(url_for('main.index'))
+    form = ResetPasswordForm()
+    if form.validate_on_submit():
+        user.set_password(form.password.data)
+        db.session.commit()
+        flash('Your Techblog`s Account Password has been Reset.')
+        return redirect(url_for('auth.login'))
+    return render_template('reset_password.html', form=form)
@@ -0,0 +1,247 @@
+import contextvars
+import json
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from hashlib import md5
+import sqlalchemy as sa
+from flask import current_app
+from app import db
+from app.models import User, Post, followers
+from app.passwords import hasher
+
+BENCH_PASSWORD = 'bench'
+
+
+def power_law_weights(n, alpha):
+    """Cumulative Zipf weights for ranks 1..n, for `random.choices`"""
+    total = 0.0
+    weights = []
+    for rank in range(1, n + 1):
+        total += 1.0 / rank ** alpha
+        weights.append(total)
+    return weights
+
+
+def insert_chunks(table, rows, chunk_size):
+    """Bulk inserts `rows` with one executemany per chunk"""
+    chunk = []
+    count = 0
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            db.session.execute(sa.insert(table), chunk)
+            db.session.commit()
+            count += len(chunk)
+            chunk = []
+    if chunk:
+        db.session.execute(sa.insert(table), chunk)
+        db.session.commit()
+        count += len(chunk)
+    return count
+
+
+def seed(num_users, num_posts, follows, alpha=1.1, days=365,
+         chunk_size=5000, rng=None):
+    """Seeds a synthetic dataset: `num_users` Users, a power-law
+    `followers` graph averaging `follows` followed Users each, and
+    `num_posts` Posts whose authors follow the same popularity curve.
+    Returns the ids of the new Users and the number of follow edges"""
+    rng = rng or random.Random()
+    first_id = (db.session.scalar(sa.select(sa.func.max(User.id))) or 0) + 1
+    ids = list(range(first_id, first_id + num_users))
+    password_hash = hasher.hash(BENCH_PASSWORD)
+    now = datetime.now(timezone.utc)
+
+    def users():
+        for id in ids:
+            email = f'bench{id}@example.com'
+            yield {'id': id, 'username': f'bench{id}', 'email': email,
+                   'email_hash': md5(email.encode('utf-8')).hexdigest(),
+                   'password_hash': password_hash, 'last_seen': now}
+
+    insert_chunks(User.__table__, users(), chunk_size)
+
+    popularity = ids[:]
+    rng.shuffle(popularity)
+    weights = power_law_weights(num_users, alpha)
+
+    def edges():
+        for follower in ids:
+            degree = min(int(rng.paretovariate(alpha) * follows / 2),
+                         num_users - 1)
+            targets = set(rng.choices(popularity, cum_weights=weights,
+                                      k=degree))
+            targets.discard(follower)
+            for followed in targets:
+                yield {'follower_id': follower, 'followed_id': followed}
+
+    num_edges = insert_chunks(followers, edges(), chunk_size)
+
+    def posts():
+        for i in range(num_posts):
+            yield {'body': f'Synthetic post {i} ' +
+                           ' '.join(rng.sample(WORDS, 8)),
+                   'timestamp': now - timedelta(
+                       seconds=rng.uniform(0, days * 86400)),
+                   'user_id': rng.choices(popularity, cum_weights=weights)[0]}
+
+    insert_chunks(Post.__table__, posts(), chunk_size)
+    for start in range(first_id, first_id + num_users, chunk_size):
+        User.reconcile_counts(start, start + chunk_size - 1)
+        db.session.commit()
+    return ids, num_edges
+
+
+def percentile(values, q):
+    if len(values) < 2:
+        return values[0] if values else None
+    return statistics.quantiles(values, n=100, method='inclusive')[q - 1]
+
+
+class QueryCounter:
+    """Counts statements executed on every engine of `db`"""
+
+    def __init__(self, app):
+        self.count = 0
+        with app.app_context():
+            self.engines = list(db.engines.values())
+
+    def __enter__(self):
+        for engine in self.engines:
+            sa.event.listen(engine, 'before_cursor_execute', self.on_execute)
+        return self
+
+    def __exit__(self, *args):
+        for engine in self.engines:
+            sa.event.remove(engine, 'before_cursor_execute', self.on_execute)
+
+    def on_execute(self, *args):
+        self.count += 1
+
+
+def run(requests, rng=None):
+    """Drives the main routes through the Flask test client as the
+    seeded bench Users.
+    Returns latency percentiles (ms), queries per request and
+    throughput per endpoint"""
+    # the requests run in an empty context, so that each gets its own
+    # app context (and `g`, and session) even when called from the CLI
+    app = current_app._get_current_object()
+    return contextvars.Context().run(drive, app, requests,
+                                     rng or random.Random())
+
+
+def drive(app, requests, rng):
+    with app.app_context():
+        usernames = dict(db.session.execute(
+            sa.select(User.id, User.username)
+            .where(User.username.startswith('bench'))).all())
+    if not usernames:
+        raise ValueError('No bench users, run `flask bench seed` first')
+    user_ids = list(usernames)
+    csrf = app.config.get('WTF_CSRF_ENABLED', True)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    def logged_in_client():
+        client = app.test_client()
+        with client.session_transaction() as session:
+            session['_user_id'] = str(rng.choice(user_ids))
+            session['_fresh'] = True
+        return client
+
+    def target():
+        return usernames[rng.choice(user_ids)]
+
+    scenarios = {
+        'index': lambda: logged_in_client().get('/index'),
+        'explore': lambda: logged_in_client().get('/explore'),
+        'user': lambda: logged_in_client().get(f'/user/{target()}'),
+        'login': lambda: app.test_client().post('/login', data={
+            'username': target(), 'password': BENCH_PASSWORD}),
+        'follow': lambda: logged_in_client().post(f'/follow/{target()}'),
+    }
+    results = {}
+    try:
+        with QueryCounter(app) as counter:
+            for name, scenario in scenarios.items():
+                latencies = []
+                queries = []
+                errors = 0
+                started = time.perf_counter()
+                for _ in range(requests):
+                    counter.count = 0
+                    t0 = time.perf_counter()
+                    response = scenario()
+                    latencies.append((time.perf_counter() - t0) * 1000)
+                    queries.append(counter.count)
+                    if response.status_code >= 400:
+                        errors += 1
+                elapsed = time.perf_counter() - started
+                results[name] = {
+                    'requests': requests,
+                    'errors': errors,
+                    'p50_ms': percentile(latencies, 50),
+                    'p95_ms': percentile(latencies, 95),
+                    'p99_ms': percentile(latencies, 99),
+                    'mean_queries': statistics.fmean(queries),
+                    'max_queries': max(queries),
+                    'throughput_rps': requests / elapsed,
+                }
+    finally:
+        app.config['WTF_CSRF_ENABLED'] = csrf
+    return results
+
+
+STARTUP_COMMANDS = {
+    'create_app': [sys.executable, '-c',
+                   'from app import create_app; create_app()'],
+    'flask_cli': [sys.executable, '-m', 'flask', '--help'],
+}
+
+
+def startup(runs):
+    """Times fresh interpreters running `create_app` and the `flask`
+    CLI, i.e. worker cold start and CLI latency.
+    Returns latency percentiles (ms) per command"""
+    results = {}
+    for name, command in STARTUP_COMMANDS.items():
+        latencies = []
+        for _ in range(runs):
+            t0 = time.perf_counter()
+            subprocess.run(command, check=True, stdout=subprocess.DEVNULL)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        results[name] = {
+            'runs': runs,
+            'p50_ms': percentile(latencies, 50),
+            'p95_ms': percentile(latencies, 95),
+            'min_ms': min(latencies),
+        }
+    return results
+
+
+def save(results, path):
+    """Writes a benchmark run, with the settings it ran under, as JSON"""
+    data = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'database': db.engine.dialect.name,
+        'users': db.session.scalar(sa.select(sa.func.count(User.id))),
+        'posts': db.session.scalar(sa.select(sa.func.count(Post.id))),
+        'config': {key: current_app.config[key] for key in (
+            'TIMELINE_MATERIALIZED', 'KEYSET_PAGINATION', 'POSTS_PER_PAGE',
+            'PASSWORD_HASH_WORKERS', 'SQLITE_JOURNAL_MODE')},
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    return data
+
+
+WORDS = '''python flask sqlite index query cache latency thread process
+socket kernel memory buffer stream cursor commit schema timeline follow
+post render template engine pool worker queue batch vector graph node
+edge search token session cookie header proxy server client async
+'''.split()
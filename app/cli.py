@@ -0,0 +1,265 @@
+import random
+import time
+from datetime import datetime, timedelta, timezone
+import click
+import sqlalchemy as sa
+from flask import Blueprint, current_app
+from app import db, bench, data
+from app.suggestions import rebuild_suggestions
+from app.archive import archive_posts, optimize_tables
+from app.plans import check_plans
+from app.models import User, followers, timeline, timeline_horizon
+from app.search import create_index, rebuild_index
+
+bp = Blueprint('cli', __name__, cli_group=None)
+
+
+@bp.cli.group('timeline')
+def timeline_group():
+    """Materialized Home Timeline Commands"""
+    pass
+
+
+@timeline_group.command()
+def rebuild():
+    """Rebuilds every User's materialized timeline from the
+    `followers` and `post` tables"""
+    rebuild_timelines()
+    click.echo('Timelines rebuilt.')
+
+
+@timeline_group.command()
+def trim():
+    """Drops the materialized timeline entries older than
+    TIMELINE_HORIZON days, which are read on demand instead"""
+    deleted = db.session.execute(sa.delete(timeline).where(
+        timeline.c.timestamp < timeline_horizon())).rowcount
+    db.session.commit()
+    click.echo(f'Trimmed {deleted} timeline entries.')
+
+
+def rebuild_timelines():
+    db.session.execute(
+        sa.update(User).values(pull_on_read=User.num_followers >
+                               current_app.config['TIMELINE_FANOUT_LIMIT']))
+    db.session.execute(sa.delete(timeline))
+    User.insert_timelines(sa.union_all(
+        sa.select(followers.c.follower_id.label('user_id'),
+                  followers.c.followed_id.label('author_id'))
+        .join(User, User.id == followers.c.followed_id)
+        .where(~User.pull_on_read),
+        sa.select(User.id.label('user_id'), User.id.label('author_id'))))
+    db.session.commit()
+
+
+@bp.cli.group()
+def counters():
+    """Denormalized User Counter Commands"""
+    pass
+
+
+@counters.command()
+@click.option('--chunk-size', default=1000, type=int,
+              help='Users to recompute per transaction.')
+def reconcile(chunk_size):
+    """Recomputes every User's follower, following and post counters"""
+    last_id = db.session.scalar(sa.select(sa.func.max(User.id))) or 0
+    updated = 0
+    for first_id in range(1, last_id + 1, chunk_size):
+        updated += User.reconcile_counts(first_id,
+                                         first_id + chunk_size - 1)
+        db.session.commit()
+    click.echo(f'Counters reconciled for {updated} users.')
+
+
+@bp.cli.group('search')
+def search_group():
+    """Full-Text Search Index Commands"""
+    pass
+
+
+@search_group.command('rebuild')
+def search_rebuild():
+    """Creates the FTS5 indexes if needed and repopulates them from
+    `post` and `post_archive`"""
+    if db.engine.dialect.name != 'sqlite':
+        click.echo('Full-text indexing needs SQLite, nothing to do.')
+        return
+    create_index()
+    rebuild_index()
+    db.session.commit()
+    click.echo('Search index rebuilt.')
+
+
+@bp.cli.group()
+def posts():
+    """Post Archival Commands"""
+    pass
+
+
+@posts.command()
+@click.option('--days', default=365,
+              help='Archive Posts older than this many days.')
+@click.option('--batch-size', default=1000,
+              help='Posts moved per transaction.')
+@click.option('--vacuum/--no-vacuum', default=True,
+              help='Reclaim the freed space afterwards.')
+def archive(days, batch_size, vacuum):
+    """Moves old Posts to the `post_archive` table, then runs
+    ANALYZE and VACUUM"""
+    before = datetime.now(timezone.utc) - timedelta(days=days)
+    started = time.perf_counter()
+    moved = archive_posts(before, batch_size, report=click.echo)
+    click.echo(f'Archived {moved} posts older than {before:%Y-%m-%d} in '
+               f'{time.perf_counter() - started:.1f}s.')
+    optimize_tables(vacuum, report=click.echo)
+
+
+@bp.cli.group('suggestions')
+def suggestions_group():
+    """Who to Follow Suggestion Commands"""
+    pass
+
+
+@suggestions_group.command('rebuild')
+@click.option('--top-k', default=10, help='Suggestions kept per User.')
+@click.option('--max-degree', default=200,
+              help='Follows sampled per User when scoring.')
+@click.option('--chunk-size', default=1000,
+              help='Users replaced per transaction.')
+@click.option('--max-memory', default=1024,
+              help='Memory budget for the follower graph, in MiB.')
+@click.option('--seed', default=None, type=int, help='Random seed.')
+def suggestions_rebuild(top_k, max_degree, chunk_size, max_memory, seed):
+    """Recomputes every User's friend-of-friend follow suggestions"""
+    started = time.perf_counter()
+    try:
+        users, rows = rebuild_suggestions(
+            top_k, max_degree, chunk_size, max_memory * 2**20,
+            random.Random(seed), report=click.echo)
+    except MemoryError as e:
+        raise click.ClickException(f'{e}, raise --max-memory.')
+    click.echo(f'Stored {rows} suggestions for {users} users in '
+               f'{time.perf_counter() - started:.1f}s.')
+
+
+@bp.cli.group('bench')
+def bench_group():
+    """Synthetic Dataset and Route Benchmark Commands"""
+    pass
+
+
+@bench_group.command('seed')
+@click.option('--users', default=1000, help='Users to create.')
+@click.option('--posts', default=20000, help='Posts to create.')
+@click.option('--follows', default=20, help='Average Users followed.')
+@click.option('--alpha', default=1.1, help='Power-law exponent.')
+@click.option('--seed', default=None, type=int, help='Random seed.')
+def bench_seed(users, posts, follows, alpha, seed):
+    """Bulk inserts Users, a power-law follower graph and Posts"""
+    started = time.perf_counter()
+    ids, edges = bench.seed(users, posts, follows, alpha,
+                            rng=random.Random(seed))
+    if current_app.config['TIMELINE_MATERIALIZED']:
+        rebuild_timelines()
+    click.echo(f'Seeded {len(ids)} users, {edges} follows and {posts} '
+               f'posts in {time.perf_counter() - started:.1f}s.')
+
+
+@bench_group.command('run')
+@click.option('--requests', default=200, help='Requests per endpoint.')
+@click.option('--output', default='bench_output.json',
+              help='File to save the results to.')
+@click.option('--seed', default=None, type=int, help='Random seed.')
+def bench_run(requests, output, seed):
+    """Benchmarks index, explore, user, login and follow"""
+    results = bench.run(requests, rng=random.Random(seed))
+    for name, result in results.items():
+        click.echo(f'{name:8} p50 {result["p50_ms"]:7.2f}ms  '
+                   f'p95 {result["p95_ms"]:7.2f}ms  '
+                   f'p99 {result["p99_ms"]:7.2f}ms  '
+                   f'{result["mean_queries"]:5.1f} queries  '
+                   f'{result["throughput_rps"]:7.1f} req/s')
+    bench.save(results, output)
+    click.echo(f'Results saved to {output}.')
+
+
+@bench_group.command('startup')
+@click.option('--runs', default=10, help='Cold starts per command.')
+def bench_startup(runs):
+    """Times cold starts of the app and of the flask CLI"""
+    click.echo(f'create_app in this process: '
+               f'{current_app.startup_time * 1000:.1f}ms')
+    for name, result in bench.startup(runs).items():
+        click.echo(f'{name:10} p50 {result["p50_ms"]:7.1f}ms  '
+                   f'p95 {result["p95_ms"]:7.1f}ms  '
+                   f'min {result["min_ms"]:7.1f}ms')
+
+
+@bench_group.command('explain')
+@click.option('--user', 'username', default=None,
+              help='User to plan the queries for, the first by default.')
+@click.option('--verbose', is_flag=True, help='Print every query plan.')
+def bench_explain(username, verbose):
+    """Checks that the hot queries are planned without a full table scan
+    or a temporary sort, exiting with an error if any is not"""
+    if db.engine.dialect.name != 'sqlite':
+        raise click.ClickException('Query plans are only checked on SQLite.')
+    query = sa.select(User).order_by(User.id).limit(1)
+    if username is not None:
+        query = sa.select(User).where(User.username == username)
+    user = db.session.scalar(query)
+    if user is None:
+        raise click.ClickException('No such user, seed some data first.')
+    failed = 0
+    for name, plan, problems in check_plans(user):
+        failed += bool(problems)
+        click.echo(f'{"FAIL" if problems else "ok":4}  {name}')
+        for line in plan if verbose or problems else ():
+            click.echo(f'      {line}')
+    if failed:
+        raise click.ClickException(
+            f'{failed} queries need a full scan or a temporary sort.')
+
+
+@bp.cli.group('data')
+def data_group():
+    """Bulk Import and Export Commands"""
+    pass
+
+
+@data_group.command('export')
+@click.argument('table', type=click.Choice(list(data.TABLES)))
+@click.argument('file', type=click.File('w', encoding='utf-8'), default='-')
+@click.option('--format', 'format', type=click.Choice(['jsonl', 'csv']),
+              default='jsonl')
+@click.option('--chunk-size', default=1000, help='Rows fetched per batch.')
+def data_export(table, file, format, chunk_size):
+    """Streams a table (users, posts, followers or archived_posts) to FILE"""
+    report = lambda message: click.echo(message, err=True)
+    rows = data.export_table(table, file, format, chunk_size, report)
+    click.echo(f'Exported {rows} {table}.', err=True)
+
+
+@data_group.command('import')
+@click.argument('table', type=click.Choice(list(data.TABLES)))
+@click.argument('file', type=click.File('r', encoding='utf-8'), default='-')
+@click.option('--format', 'format', type=click.Choice(['jsonl', 'csv']),
+              default='jsonl')
+@click.option('--chunk-size', default=1000,
+              help='Rows inserted per transaction.')
+@click.option('--reconcile/--no-reconcile', default=True,
+              help='Recompute the User counters afterwards.')
+def data_import(table, file, format, chunk_size, reconcile):
+    """Bulk loads a table (users, posts, followers or archived_posts) from FILE"""
+    report = lambda message: click.echo(message, err=True)
+    rows = data.import_table(table, file, format, chunk_size, report)
+    click.echo(f'Imported {rows} {table}.', err=True)
+    if reconcile:
+        last_id = db.session.scalar(sa.select(sa.func.max(User.id))) or 0
+        for first_id in range(1, last_id + 1, chunk_size):
+            User.reconcile_counts(first_id, first_id + chunk_size - 1)
+            db.session.commit()
+    if current_app.config['TIMELINE_MATERIALIZED'] and table != 'users':
+        click.echo('Run `flask timeline rebuild` to refresh timelines.',
+                   err=True)
@@ -0,0 +1,207 @@
+import itertools
+import threading
+import zlib
+from collections import OrderedDict
+from hashlib import md5
+from flask import current_app
+from werkzeug.datastructures import Headers
+from werkzeug.local import LocalProxy
+from werkzeug.http import parse_accept_header
+from werkzeug.wsgi import ClosingIterator
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSIBLE_TYPES = {
+    'text/html', 'text/plain', 'text/css', 'text/csv', 'text/xml',
+    'text/javascript', 'application/javascript', 'application/json',
+    'application/xml', 'image/svg+xml',
+}
+
+
+class Compression:
+    """Gzip, or Brotli when the `brotli` package is installed, for
+    responses of the COMPRESSIBLE_TYPES the client accepts.
+    Wraps `app.wsgi_app` so it also covers streamed responses, which
+    are compressed chunk by chunk as the generator yields instead of
+    being buffered. Responses with a Content-Length under
+    COMPRESS_MIN_SIZE go out as they are. Compressed bodies are kept in
+    an LRU of COMPRESS_CACHE_SIZE entries keyed on a digest of the
+    uncompressed body, so a page served again unchanged is not
+    compressed again. HEAD requests get the headers of the compressed
+    GET. COMPRESS_DISABLED turns it all off.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.bodies = OrderedDict()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['compression'] = self
+        self.level = app.config['COMPRESS_LEVEL']
+        self.brotli_quality = app.config['COMPRESS_BROTLI_QUALITY']
+        self.min_size = app.config['COMPRESS_MIN_SIZE']
+        self.cache_size = app.config['COMPRESS_CACHE_SIZE']
+        if app.config['COMPRESS_ENABLED']:
+            app.wsgi_app = CompressionMiddleware(app.wsgi_app, self)
+
+    def negotiate(self, accept_encoding):
+        """Returns the encoding to use for an Accept-Encoding header,
+        or None"""
+        if not accept_encoding:
+            return None
+        accept = parse_accept_header(accept_encoding)
+        gzip_quality = accept.quality('gzip')
+        if brotli is not None and accept.quality('br') and \
+                accept.quality('br') >= gzip_quality:
+            return 'br'
+        if gzip_quality:
+            return 'gzip'
+        return None
+
+    def compressor(self, encoding):
+        """Returns (compress, flush, finish) functions of a new
+        streaming compressor for `encoding`"""
+        if encoding == 'br':
+            c = brotli.Compressor(quality=self.brotli_quality)
+            return c.process, c.flush, c.finish
+        # wbits 31 writes a gzip header and trailer around the deflate data
+        c = zlib.compressobj(self.level, zlib.DEFLATED, 31)
+        return c.compress, lambda: c.flush(zlib.Z_SYNC_FLUSH), c.flush
+
+    def compress(self, body, encoding):
+        """Returns `body` compressed with `encoding`, from the LRU of
+        compressed bodies when the same body was compressed before"""
+        key = md5(body).digest(), encoding
+        with self.lock:
+            compressed = self.bodies.get(key)
+            if compressed is not None:
+                self.bodies.move_to_end(key)
+                return compressed
+        compress, _, finish = self.compressor(encoding)
+        compressed = compress(body) + finish()
+        if self.cache_size:
+            with self.lock:
+                self.bodies[key] = compressed
+                while len(self.bodies) > self.cache_size:
+                    self.bodies.popitem(last=False)
+        return compressed
+
+
+class CompressionMiddleware:
+    """The WSGI side of `Compression`"""
+
+    # streamed output is flushed to the client at least this often
+    flush_size = 16384
+
+    def __init__(self, wsgi_app, compression):
+        self.wsgi_app = wsgi_app
+        self.compression = compression
+
+    def __call__(self, environ, start_response):
+        encoding = self.compression.negotiate(
+            environ.get('HTTP_ACCEPT_ENCODING'))
+        head = environ['REQUEST_METHOD'] == 'HEAD'
+        if head and encoding is not None:
+            # the Content-Length of a compressed body needs the body, so
+            # HEAD runs as the GET it stands for and the body is dropped
+            environ = dict(environ, REQUEST_METHOD='GET')
+        response = []
+
+        # headers are held back until the body shows how to send it
+        def capture(status, headers, exc_info=None):
+            response[:] = [status, Headers(headers), exc_info]
+            return self.write
+
+        app_iter = self.wsgi_app(environ, capture)
+        if not response:
+            # generator apps only start the response once iterated
+            chunks = iter(app_iter)
+            first = next(chunks, b'')
+            app_iter = ClosingIterator(
+                itertools.chain([first], chunks),
+                getattr(app_iter, 'close', None))
+        status, headers, exc_info = response
+        if not self.compressible(status, headers):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return self.discard(app_iter) if head else app_iter
+        vary = headers.get('Vary')
+        if not vary:
+            headers['Vary'] = 'Accept-Encoding'
+        elif 'accept-encoding' not in vary.lower():
+            headers['Vary'] = vary + ', Accept-Encoding'
+        length = headers.get('Content-Length', type=int)
+        if encoding is None or (length is not None and
+                                length < self.compression.min_size):
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            return self.discard(app_iter) if head else app_iter
+        headers['Content-Encoding'] = encoding
+        etag = headers.get('ETag')
+        if etag and not etag.startswith('W/'):
+            # the compressed bytes differ, so only a weak match holds
+            headers['ETag'] = 'W/' + etag
+        if length is None:
+            start_response(status, headers.to_wsgi_list(), exc_info)
+            if head:
+                return self.discard(app_iter)
+            return self.stream(app_iter, encoding)
+        try:
+            body = b''.join(app_iter)
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+        body = self.compression.compress(body, encoding)
+        headers['Content-Length'] = str(len(body))
+        start_response(status, headers.to_wsgi_list(), exc_info)
+        return [] if head else [body]
+
+    @staticmethod
+    def write(data):
+        raise RuntimeError('The write() callable is not supported')
+
+    @staticmethod
+    def discard(app_iter):
+        """Closes a body that is not sent, as for HEAD"""
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+        return []
+
+    @staticmethod
+    def compressible(status, headers):
+        if status[:3] in ('204', '206', '304') or \
+                'Content-Encoding' in headers or \
+                'Content-Range' in headers:
+            return False
+        if 'no-transform' in headers.get('Cache-Control', ''):
+            return False
+        mimetype = headers.get('Content-Type', '').split(';')[0].strip()
+        return mimetype in COMPRESSIBLE_TYPES
+
+    def stream(self, app_iter, encoding):
+        """Compresses a streamed body as it is generated, flushing the
+        compressor every `flush_size` bytes so output is never held
+        back for long"""
+        compress, flush, finish = self.compression.compressor(encoding)
+        pending = 0
+        try:
+            for chunk in app_iter:
+                pending += len(chunk)
+                data = compress(chunk)
+                if pending >= self.flush_size:
+                    data += flush()
+                    pending = 0
+                yield data
+            yield finish()
+        finally:
+            if hasattr(app_iter, 'close'):
+                app_iter.close()
+
+
+# the current app's Compression
+compression = LocalProxy(lambda: current_app.extensions['compression'])
@@ -0,0 +1,51 @@
+import time
+from datetime import datetime, timezone
+from hashlib import md5
+from flask import g, request, session, Response, current_app
+from flask_login import current_user
+
+
+def not_modified(*validators, last_modified=None):
+    """Conditional GET for a page built from cheap `validators`, e.g. the
+    id of the newest Post in scope.
+    The ETag also covers the url, the viewer and the CSRF token period,
+    since those change the rendered page, and Last-Modified is never
+    older than the start of that period. Returns a 304 Response when the
+    request's If-None-Match or If-Modified-Since matches, else None and
+    the validators go out on the rendered page"""
+    if request.method != 'GET' or session.get('_flashes'):
+        return None
+    viewer = (current_user.id, current_user.profile_version) \
+        if current_user.is_authenticated else None
+    period = (current_app.config.get('WTF_CSRF_TIME_LIMIT') or 3600) // 2
+    csrf_period = int(time.time() // period)
+    etag = md5(repr((request.full_path, viewer, csrf_period) +
+                    validators).encode('utf-8')).hexdigest()
+    if last_modified is not None:
+        last_modified = max(
+            last_modified.replace(tzinfo=timezone.utc, microsecond=0),
+            datetime.fromtimestamp(csrf_period * period, timezone.utc))
+    g.conditional = etag, last_modified
+    if request.if_none_match:
+        matches = request.if_none_match.contains_weak(etag)
+    else:
+        since = request.if_modified_since
+        matches = since is not None and last_modified is not None and \
+            last_modified <= since
+    if matches:
+        return Response(status=304)
+    return None
+
+
+def add_validators(response):
+    """Adds the ETag/Last-Modified found by `not_modified` to the page.
+    The pages are per viewer, so they may only be cached privately and
+    must be revalidated on every use"""
+    if 'conditional' in g and response.status_code in (200, 304):
+        etag, last_modified = g.conditional
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+    return response
@@ -0,0 +1,122 @@
+import csv
+import json
+import time
+from datetime import datetime
+from hashlib import md5
+import sqlalchemy as sa
+from app import db
+from app.models import User, Post, ArchivedPost, followers
+
+TABLES = {
+    'users': (User.__table__, ('id', 'username', 'email', 'password_hash',
+                               'about_me', 'last_seen')),
+    'posts': (Post.__table__, ('id', 'body', 'timestamp', 'user_id')),
+    'followers': (followers, ('follower_id', 'followed_id')),
+    'archived_posts': (ArchivedPost.__table__,
+                       ('id', 'body', 'timestamp', 'user_id')),
+}
+
+
+def to_text(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def from_text(column, value):
+    """Converts a value read from JSONL or CSV back to the column's type"""
+    if value is None or value == '':
+        return None if column.nullable else value
+    if isinstance(column.type, sa.DateTime):
+        return datetime.fromisoformat(value)
+    if isinstance(column.type, sa.Integer):
+        return int(value)
+    return value
+
+
+class Progress:
+    """Reports rows done and rows per second every `every` rows"""
+
+    def __init__(self, report, every):
+        self.report = report
+        self.every = every
+        self.rows = 0
+        self.started = time.perf_counter()
+
+    def add(self, rows):
+        before = self.rows // self.every
+        self.rows += rows
+        if self.rows // self.every != before:
+            self.show()
+
+    def show(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.rows / elapsed if elapsed else 0
+        self.report(f'{self.rows} rows ({rate:.0f} rows/s)')
+
+
+def export_rows(name, chunk_size):
+    """Streams the rows of an exportable table as dicts.
+    Uses a server-side cursor, so memory stays flat on large tables"""
+    table, columns = TABLES[name]
+    query = sa.select(*[table.c[column] for column in columns]) \
+        .order_by(*table.primary_key.columns) \
+        .execution_options(yield_per=chunk_size)
+    for row in db.session.execute(query):
+        yield {column: to_text(value)
+               for column, value in zip(columns, row)}
+
+
+def export_table(name, file, format='jsonl', chunk_size=1000, report=print):
+    """Writes a table to `file` as JSONL or CSV"""
+    columns = TABLES[name][1]
+    progress = Progress(report, chunk_size * 10)
+    if format == 'csv':
+        writer = csv.DictWriter(file, fieldnames=columns)
+        writer.writeheader()
+        write = writer.writerow
+    else:
+        def write(row):
+            file.write(json.dumps(row) + '\n')
+    for row in export_rows(name, chunk_size):
+        write(row)
+        progress.add(1)
+    progress.show()
+    return progress.rows
+
+
+def read_rows(file, format='jsonl'):
+    if format == 'csv':
+        yield from csv.DictReader(file)
+    else:
+        for line in file:
+            if line.strip():
+                yield json.loads(line)
+
+
+def import_table(name, file, format='jsonl', chunk_size=1000, report=print):
+    """Bulk loads JSONL or CSV rows from `file` into a table with one
+    executemany INSERT and one commit per `chunk_size` rows"""
+    table, columns = TABLES[name]
+    progress = Progress(report, chunk_size * 10)
+    chunk = []
+
+    def flush():
+        db.session.execute(sa.insert(table), chunk)
+        db.session.commit()
+        progress.add(len(chunk))
+        chunk.clear()
+
+    for data in read_rows(file, format):
+        row = {column: from_text(table.c[column], data.get(column))
+               for column in columns if column in data}
+        if name == 'users':
+            row['email_hash'] = md5(
+                row['email'].lower().encode('utf-8')).hexdigest()
+        chunk.append(row)
+        if len(chunk) >= chunk_size:
+            flush()
+    if chunk:
+        flush()
+    progress.show()
+    return progress.rows
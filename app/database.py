@@ -0,0 +1,90 @@
+import sqlite3
+from functools import wraps
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from flask import g, has_request_context
+from flask_sqlalchemy.session import Session
+from app.forks import reset_after_fork
+
+
+class RoutingSession(Session):
+    """A Session that sends plain SELECTs to the `read` bind while the
+    current request is marked with `read_only`.
+    Flushes, writes and everything outside such requests keep using
+    the primary database.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_request_context() \
+                and g.get('read_only') and isinstance(clause, sa.Select):
+            engine = self._db.engines.get('read')
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind,
+                                **kwargs)
+
+
+def read_only(f):
+    """Marks a view as safe to serve from the read-only bind"""
+    @wraps(f)
+    def decorated_view(*args, **kwargs):
+        g.read_only = True
+        return f(*args, **kwargs)
+    return decorated_view
+
+
+def insert_ignore(session, table):
+    """An INSERT into `table` that skips rows whose key already exists:
+    ON CONFLICT DO NOTHING on SQLite and PostgreSQL, INSERT IGNORE on
+    MySQL and MariaDB. Other databases get a plain INSERT, so callers
+    must leave out the rows that exist"""
+    dialect = session.get_bind().dialect.name
+    if dialect == 'sqlite':
+        return sqlite.insert(table).on_conflict_do_nothing()
+    if dialect == 'postgresql':
+        return postgresql.insert(table).on_conflict_do_nothing()
+    if dialect in ('mysql', 'mariadb'):
+        return mysql.insert(table).prefix_with('IGNORE')
+    return sa.insert(table)
+
+
+def configure_engines(app, db):
+    """Applies the SQLITE_* pragmas to every new SQLite connection.
+    Connections of the `read` bind are also made query-only"""
+    with app.app_context():
+        engines = dict(db.engines)
+    for key, engine in engines.items():
+        if engine.dialect.name == 'sqlite':
+            sa.event.listen(engine, 'connect',
+                            sqlite_pragmas(app.config, key == 'read'))
+
+
+def dispose_engines_after_fork(app, db):
+    """Makes a forked worker open its own database connections instead
+    of sharing the pooled ones it inherited from the parent"""
+    with app.app_context():
+        for engine in db.engines.values():
+            reset_after_fork(engine, dispose_engine)
+
+
+def dispose_engine(engine):
+    engine.dispose(close=False)
+
+
+def sqlite_pragmas(config, query_only=False):
+    def on_connect(dbapi_connection, connection_record):
+        if not isinstance(dbapi_connection, sqlite3.Connection):
+            return
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA busy_timeout = {:d}'.format(
+            config['SQLITE_BUSY_TIMEOUT']))
+        cursor.execute('PRAGMA journal_mode = {}'.format(
+            config['SQLITE_JOURNAL_MODE']))
+        cursor.execute('PRAGMA synchronous = {}'.format(
+            config['SQLITE_SYNCHRONOUS']))
+        cursor.execute('PRAGMA mmap_size = {:d}'.format(
+            config['SQLITE_MMAP_SIZE']))
+        if query_only:
+            cursor.execute('PRAGMA query_only = ON')
+        cursor.close()
+    return on_connect
@@ -1,37 +1,163 @@
-from threading import Thread
-from flask import render_template
+import atexit
+import queue
+import smtplib
+import threading
+import time
+from flask import render_template, current_app
 from flask_mail import Message
-from app import mail, app
+from werkzeug.local import LocalProxy
+from app import mail
+from app.forks import reset_after_fork
 
 
-def send_email(subject, sender, recepients,
-               text_body, html_body):
-    """An Email Sending Wrapper Function"""
-    msg = Message(subject, sender=sender,
-                  recepients=recepients)
+class MailQueue:
+    """A bounded queue of outgoing Messages drained by a fixed pool of
+    delivery threads.
+    Each worker takes up to MAIL_BATCH_SIZE queued Messages and sends
+    them over a single SMTP connection (`mail.connect()`), retrying the
+    undelivered remainder with exponential backoff. Enqueueing blocks
+    for up to MAIL_ENQUEUE_TIMEOUT seconds when the queue is full.
+    Queued mail is drained when the process exits.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.queue = None
+        self.workers = []
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.queue = queue.Queue(maxsize=app.config['MAIL_QUEUE_SIZE'])
+        app.extensions['mail_queue'] = self
+        reset_after_fork(self)
+
+    def after_fork(self):
+        # the workers do not survive a fork, and mail queued in the
+        # parent is the parent's to send
+        self.queue = queue.Queue(maxsize=self.app.config['MAIL_QUEUE_SIZE'])
+        self.workers = []
+        self.lock = threading.Lock()
+
+    def put(self, msg):
+        """Queues `msg` for delivery.
+        Returns False if the queue stayed full for MAIL_ENQUEUE_TIMEOUT"""
+        with self.lock:
+            if not self.workers:
+                self.start()
+        try:
+            self.queue.put(msg, timeout=self.app.config['MAIL_ENQUEUE_TIMEOUT'])
+        except queue.Full:
+            self.app.logger.error('Mail queue full, dropped email to %s',
+                                  ', '.join(msg.recipients))
+            return False
+        return True
+
+    def start(self):
+        for i in range(self.app.config['MAIL_WORKERS']):
+            worker = threading.Thread(target=self.run, daemon=True,
+                                      name=f'mail-worker-{i}')
+            worker.start()
+            self.workers.append(worker)
+        atexit.register(self.stop)
+
+    def stop(self):
+        """Lets the workers finish the queued mail, then ends them"""
+        timeout = self.app.config['MAIL_DRAIN_TIMEOUT']
+        deadline = time.monotonic() + timeout
+        for worker in self.workers:
+            try:
+                self.queue.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for worker in self.workers:
+            worker.join(max(deadline - time.monotonic(), 0))
+
+    def run(self):
+        batch_size = self.app.config['MAIL_BATCH_SIZE']
+        running = True
+        while running:
+            batch = []
+            msg = self.queue.get()
+            while msg is not None:
+                batch.append(msg)
+                if len(batch) >= batch_size:
+                    break
+                try:
+                    msg = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+            if msg is None:
+                running = False
+            if batch:
+                self.deliver(batch)
+            for _ in range(len(batch) + (not running)):
+                self.queue.task_done()
+
+    def deliver(self, batch):
+        """Sends `batch` over one SMTP connection, retrying the rest of
+        the batch on a new connection when the connection fails"""
+        retries = self.app.config['MAIL_MAX_RETRIES']
+        backoff = self.app.config['MAIL_RETRY_BACKOFF']
+        pending = list(batch)
+        with self.app.app_context():
+            for attempt in range(retries + 1):
+                try:
+                    with mail.connect() as conn:
+                        while pending:
+                            self.send(conn, pending[0])
+                            pending.pop(0)
+                    return
+                except (smtplib.SMTPException, OSError):
+                    if attempt == retries:
+                        self.app.logger.exception(
+                            'Failed to deliver %d emails', len(pending))
+                        return
+                    time.sleep(backoff * 2 ** attempt)
+
+    def send(self, conn, msg):
+        """Sends one Message, logging and dropping it if the server
+        rejects it for good, so the rest of the batch still goes out"""
+        try:
+            conn.send(msg)
+        except smtplib.SMTPException as e:
+            if not rejected(e):
+                raise
+            self.app.logger.error('Email to %s rejected: %s',
+                                  ', '.join(msg.recipients), e)
+
+
+def rejected(error):
+    """Checks whether an SMTP error refuses the message itself, which no
+    retry would get through: every recipient refused or a 5xx reply.
+    The server resets the transaction, so the connection stays usable"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and \
+        error.smtp_code >= 500
+
+
+# the current app's MailQueue
+mail_queue = LocalProxy(lambda: current_app.extensions['mail_queue'])
+
+
+def send_email(subject, sender, recipients, text_body, html_body):
+    """An Email Sending Wrapper Function.
+    Delivery happens on the mail worker pool"""
+    msg = Message(subject, sender=sender, recipients=recipients)
     msg.body = text_body
     msg.html = html_body
-    mail.send(msg)
+    return mail_queue.put(msg)
 
 
 def send_password_reset_email(user):
     token = user.get_reset_password_token()
     send_email('[TechBlog] Reset Your Password',
-               sender=app.config['ADMINS'][0],
-               recepients=[user.email],
+               sender=current_app.config['ADMINS'][0],
+               recipients=[user.email],
                text_body=render_template('email/reset_password.txt',
                                          user=user, token=token),
                html_body=render_template('email/reset_password.html',
                                          user=user, token=token))
-
-
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
-
-
-def send_email(subject, sender, recipients, text_body, html_body):
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
-    Thread(target=send_async_email, args=(app, msg)).start()
\ No newline at end of file
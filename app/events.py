@@ -0,0 +1,145 @@
+import json
+import queue
+import threading
+from abc import ABC, abstractmethod
+from flask import current_app
+from werkzeug.local import LocalProxy
+from werkzeug.utils import import_string
+from app.forks import reset_after_fork
+
+
+class Broker(ABC):
+    """Carries events between the worker processes.
+    `publish` sends an event to every worker, including this one, and
+    `start` makes the broker call `deliver(channel, data)` for each
+    event any worker publishes. A broker shared between workers, e.g.
+    over Redis pub/sub, sends `data` as JSON and delivers from its own
+    listener thread; it is started again in every forked worker.
+    Set EVENTS_BROKER to the import path of the class to use."""
+
+    @abstractmethod
+    def start(self, app, deliver):
+        """Starts delivering the events every worker publishes"""
+
+    @abstractmethod
+    def publish(self, channel, data):
+        """Sends an event on `channel` to every worker"""
+
+
+class LocalBroker(Broker):
+    """A Broker that only reaches the subscribers of this process,
+    for a single worker and for development"""
+
+    def __init__(self):
+        self.deliver = None
+
+    def start(self, app, deliver):
+        self.deliver = deliver
+
+    def publish(self, channel, data):
+        # subscribers get the same copy a shared broker would deliver
+        self.deliver(channel, json.loads(json.dumps(data)))
+
+
+class Subscription:
+    """One event stream's bounded queue of events.
+    Events that do not fit are dropped and `overflowed` is set, so the
+    stream can tell its client to reload instead"""
+
+    def __init__(self, channels, size):
+        self.channels = channels
+        self.queue = queue.Queue(size)
+        self.overflowed = False
+
+    def put(self, data):
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Returns the next event, or None after `timeout` seconds"""
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class TimelineEvents:
+    """In-process pub/sub of new Posts for the timeline event streams.
+    A stream subscribes to the channels of the authors on its timeline,
+    and `publish_post` sends each new Post to its author's channel
+    through the EVENTS_BROKER. Every stream holds a worker thread, so
+    at most EVENTS_MAX_CONNECTIONS are open per worker process, each
+    buffering up to EVENTS_QUEUE_SIZE events.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.broker = None
+        self.channels = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        self.broker = import_string(app.config['EVENTS_BROKER'])()
+        self.broker.start(app, self.deliver)
+        app.extensions['timeline_events'] = self
+        reset_after_fork(self)
+
+    def after_fork(self):
+        # streams and broker connections belong to the parent
+        self.channels = {}
+        self.connections = 0
+        self.lock = threading.Lock()
+        self.broker.start(self.app, self.deliver)
+
+    def subscribe(self, channels):
+        """Returns a Subscription to `channels`, or None when this
+        worker already has EVENTS_MAX_CONNECTIONS streams open"""
+        with self.lock:
+            if self.connections >= self.app.config['EVENTS_MAX_CONNECTIONS']:
+                return None
+            self.connections += 1
+            subscription = Subscription(
+                channels, self.app.config['EVENTS_QUEUE_SIZE'])
+            for channel in channels:
+                self.channels.setdefault(channel, set()).add(subscription)
+            return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            self.connections -= 1
+            for channel in subscription.channels:
+                subscribers = self.channels.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self.channels[channel]
+
+    def deliver(self, channel, data):
+        """Queues an event from the broker for the subscribers
+        of `channel` in this process"""
+        with self.lock:
+            subscribers = list(self.channels.get(channel, ()))
+        for subscription in subscribers:
+            subscription.put(data)
+
+    def publish_post(self, post):
+        """Announces a newly committed Post to its author's followers"""
+        self.broker.publish(author_channel(post.user_id), {
+            'id': post.id,
+            'author': post.author.username,
+        })
+
+
+def author_channel(user_id):
+    return f'author:{user_id}'
+
+
+# the current app's TimelineEvents
+timeline_events = LocalProxy(
+    lambda: current_app.extensions['timeline_events'])
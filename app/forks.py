@@ -0,0 +1,24 @@
+import os
+import weakref
+
+# {obj: reset function or None} in the order the objects were added
+_resets = weakref.WeakKeyDictionary()
+
+
+def reset_after_fork(obj, reset=None):
+    """Calls `reset(obj)`, or `obj.after_fork()` by default, in every
+    forked child process for as long as `obj` lives, in the order the
+    objects were added. One hook is registered per process, however
+    many apps and objects are created"""
+    _resets[obj] = reset
+
+
+def after_fork():
+    for obj, reset in list(_resets.items()):
+        if reset is None:
+            obj.after_fork()
+        else:
+            reset(obj)
+
+
+os.register_at_fork(after_in_child=after_fork)
@@ -1,9 +1,7 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, BooleanField, PasswordField, SubmitField, TextAreaField
 from wtforms.validators import DataRequired, ValidationError, Email, EqualTo, Length
-import sqlalchemy as sa
-from app import db
-from app.models import User
+from app.usernames import username_taken, email_taken
 
 class LoginForm(FlaskForm):
     """Login Form for Existent Users"""
@@ -26,9 +24,7 @@ class RegistrationForm(FlaskForm):
         """Checks if a Username to be registered
         exists in DB already
         """
-        user = db.session.scalar(sa.select(User).where(
-            User.username == username.data))
-        if user is not None:
+        if username_taken(username.data):
             raise ValidationError('Please Use a Different Username.')
     
     
@@ -36,9 +32,7 @@ class RegistrationForm(FlaskForm):
         """Checks if an email to be registered
         exists in DB Already
         """
-        user = db.session.scalar(sa.select(User).where(
-            User.email == email.data))
-        if user is not None:
+        if email_taken(email.data):
             raise ValidationError('Please use a different email address.')
         
 
@@ -53,10 +47,8 @@ class EditProfileForm(FlaskForm):
         self.original_username = original_username
     
     def validate_username(self, username):
-        if username.data != self.original_username:
-            user = db.session.scalar(sa.select(User).where(
-                User.username == self.username.data))
-        if user is not None:
+        if username.data != self.original_username and \
+                username_taken(username.data):
             raise ValidationError('Please use a different username.')
 
 
@@ -0,0 +1,60 @@
+import threading
+from collections import OrderedDict
+from flask import render_template, current_app
+from markupsafe import Markup
+from werkzeug.local import LocalProxy
+
+
+class FragmentCache:
+    """An in-process LRU cache of rendered `_post.html` fragments.
+    Posts never change once written, so a fragment only goes stale when
+    its author renames themselves; entries are keyed on the post id and
+    the author's `profile_version`, which `edit_profile` bumps.
+    Holds at most FRAGMENT_CACHE_SIZE fragments.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.fragments = OrderedDict()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['fragment_cache'] = self
+        app.add_template_global(self.render_post, 'render_post')
+
+    def get(self, key):
+        with self.lock:
+            fragment = self.fragments.get(key)
+            if fragment is not None:
+                self.fragments.move_to_end(key)
+            return fragment
+
+    def set(self, key, fragment):
+        with self.lock:
+            self.fragments[key] = fragment
+            self.fragments.move_to_end(key)
+            while len(self.fragments) > self.app.config['FRAGMENT_CACHE_SIZE']:
+                self.fragments.popitem(last=False)
+
+    def invalidate_author(self, user):
+        """Drops every cached fragment written by `user`"""
+        with self.lock:
+            for key in [key for key in self.fragments if key[1] == user.id]:
+                del self.fragments[key]
+
+    def render_post(self, post):
+        """Returns the rendered `_post.html` for `post`,
+        from the cache when possible"""
+        key = (post.id, post.user_id, post.author.profile_version)
+        fragment = self.get(key)
+        if fragment is None:
+            fragment = Markup(render_template('_post.html', post=post))
+            self.set(key, fragment)
+        return fragment
+
+
+# the current app's FragmentCache
+fragment_cache = LocalProxy(lambda: current_app.extensions['fragment_cache'])
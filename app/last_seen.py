@@ -0,0 +1,95 @@
+import atexit
+import threading
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from flask import current_app
+from werkzeug.local import LocalProxy
+from app import db
+from app.forks import reset_after_fork
+from app.models import User
+from app.user_cache import user_cache
+
+
+class LastSeenBuffer:
+    """Collects `User.last_seen` updates in memory and writes them
+    back in batches from a background thread, so that requests do
+    not each open a write transaction just to record activity.
+    A User is only buffered when their stored last_seen is older than
+    LAST_SEEN_GRANULARITY seconds; the buffer is flushed every
+    LAST_SEEN_FLUSH_INTERVAL seconds and when the process exits.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['last_seen'] = self
+        reset_after_fork(self)
+
+    def after_fork(self):
+        # the flusher thread does not survive a fork, and the parent
+        # writes back its own buffered values
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.thread = None
+
+    def touch(self, user):
+        """Records that `user` has been seen now"""
+        now = datetime.now(timezone.utc)
+        granularity = timedelta(
+            seconds=self.app.config['LAST_SEEN_GRANULARITY'])
+        last_seen = user.last_seen
+        if last_seen is not None:
+            if last_seen.tzinfo is None:
+                last_seen = last_seen.replace(tzinfo=timezone.utc)
+            if now - last_seen < granularity:
+                return
+        with self.lock:
+            self.pending[user.id] = now
+            if self.thread is None:
+                self.start()
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, daemon=True,
+                                       name='last-seen-flusher')
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def run(self):
+        interval = self.app.config['LAST_SEEN_FLUSH_INTERVAL']
+        while not self.stopping.wait(interval):
+            self.flush()
+
+    def stop(self):
+        self.stopping.set()
+        self.flush()
+
+    def flush(self):
+        """Writes all buffered last_seen values in one batched UPDATE"""
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        if not pending:
+            return
+        rows = [{'id': id, 'last_seen': seen} for id, seen in pending.items()]
+        with self.app.app_context():
+            try:
+                db.session.execute(sa.update(User), rows)
+                db.session.commit()
+                user_cache.discard(*pending)
+            except Exception:
+                db.session.rollback()
+                self.app.logger.exception('Failed to flush last_seen')
+                with self.lock:
+                    for id, seen in pending.items():
+                        self.pending.setdefault(id, seen)
+
+
+# the current app's LastSeenBuffer
+last_seen = LocalProxy(lambda: current_app.extensions['last_seen'])
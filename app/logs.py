@@ -0,0 +1,229 @@
+import atexit
+import gzip
+import logging
+import os
+import queue
+import shutil
+import smtplib
+import threading
+import time
+from email.message import EmailMessage
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from app.forks import reset_after_fork
+
+LOG_FORMAT = '%(asctime)s %(levelname)s: %(message)s ' \
+    '[in %(pathname)s:%(lineno)d]'
+
+
+class DroppingQueueHandler(QueueHandler):
+    """A QueueHandler that never blocks the logging thread.
+    Records that do not fit in the bounded queue are counted and
+    dropped, and the count is logged once the queue has room again"""
+
+    def __init__(self, queue):
+        super().__init__(queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        key = digest_key(record)
+        record = super().prepare(record)
+        record.digest_key = key
+        return record
+
+    def enqueue(self, record):
+        with self.lock:
+            if self.dropped:
+                dropped, self.dropped = self.dropped, 0
+                notice = logging.makeLogRecord({
+                    'name': record.name, 'levelno': logging.WARNING,
+                    'levelname': 'WARNING', 'pathname': __file__,
+                    'msg': f'Log queue full, dropped {dropped} records'})
+                notice.digest_key = ('dropped',)
+                try:
+                    self.queue.put_nowait(notice)
+                except queue.Full:
+                    self.dropped += dropped
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                self.dropped += 1
+
+
+def digest_key(record):
+    """Identifies repeats of the same error: the exception type and the
+    line that raised it, or else the logging call site and message"""
+    if record.exc_info and record.exc_info[1] is not None:
+        tb = record.exc_info[2]
+        while tb is not None and tb.tb_next is not None:
+            tb = tb.tb_next
+        where = (tb.tb_frame.f_code.co_filename, tb.tb_lineno) \
+            if tb is not None else ()
+        return (record.exc_info[0].__name__,) + where
+    return record.pathname, record.lineno, str(record.msg)
+
+
+class DigestMailHandler(logging.Handler):
+    """Emails error records to `toaddrs` as periodic digests.
+    Repeats of an error (see `digest_key`) are counted rather than sent
+    again, and at most one email goes out every `interval` seconds,
+    listing up to `max_entries` distinct errors. Mail is sent from a
+    timer thread, so the QueueListener never waits on SMTP."""
+
+    def __init__(self, mailhost, fromaddr, toaddrs, subject,
+                 credentials=None, secure=None, interval=300,
+                 max_entries=50, timeout=10):
+        super().__init__()
+        self.mailhost = mailhost
+        self.fromaddr = fromaddr
+        self.toaddrs = toaddrs
+        self.subject = subject
+        self.credentials = credentials
+        self.secure = secure
+        self.interval = interval
+        self.max_entries = max_entries
+        self.timeout = timeout
+        self.entries = {}
+        self.overflow = 0
+        self.last_sent = 0.0
+        self.timer = None
+        reset_after_fork(self)
+
+    def after_fork(self):
+        # the timer thread is not copied into the child, and the errors
+        # pending in the parent are the parent's to send
+        self.entries = {}
+        self.overflow = 0
+        self.timer = None
+
+    def emit(self, record):
+        key = getattr(record, 'digest_key', None) or digest_key(record)
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                entry['count'] += 1
+                entry['last'] = record.created
+            elif len(self.entries) < self.max_entries:
+                self.entries[key] = {'count': 1, 'first': record.created,
+                                     'last': record.created,
+                                     'text': self.format(record)}
+            else:
+                self.overflow += 1
+            if self.timer is None:
+                wait = self.last_sent + self.interval - time.monotonic()
+                self.timer = threading.Timer(max(wait, 0), self.flush)
+                self.timer.daemon = True
+                self.timer.start()
+
+    def flush(self):
+        """Sends the pending digest, if any"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            entries, self.entries = self.entries, {}
+            overflow, self.overflow = self.overflow, 0
+            if not entries:
+                return
+            self.last_sent = time.monotonic()
+        try:
+            self.send(entries, overflow)
+        except Exception:
+            logging.getLogger(__name__).debug('Error digest failed',
+                                              exc_info=True)
+
+    def send(self, entries, overflow):
+        total = sum(entry['count'] for entry in entries.values()) + overflow
+        parts = []
+        for entry in entries.values():
+            first = time.strftime('%Y-%m-%d %H:%M:%S',
+                                  time.localtime(entry['first']))
+            last = time.strftime('%Y-%m-%d %H:%M:%S',
+                                 time.localtime(entry['last']))
+            parts.append(f'{entry["count"]}x between {first} and {last}:\n'
+                         f'{entry["text"]}')
+        if overflow:
+            parts.append(f'...and {overflow} more errors not listed.')
+        msg = EmailMessage()
+        msg['Subject'] = f'{self.subject} ({total} errors, ' \
+            f'{len(entries)} distinct)'
+        msg['From'] = self.fromaddr
+        msg['To'] = ', '.join(self.toaddrs)
+        msg.set_content('\n\n'.join(parts))
+        host, port = self.mailhost
+        with smtplib.SMTP(host, port, timeout=self.timeout) as smtp:
+            if self.credentials:
+                if self.secure is not None:
+                    smtp.ehlo()
+                    smtp.starttls(*self.secure)
+                    smtp.ehlo()
+                smtp.login(*self.credentials)
+            smtp.send_message(msg)
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+def restart_listener(listener):
+    # listener threads do not survive a fork, start them again
+    if listener._thread is not None:
+        listener.start()
+
+
+def gzip_rotator(source, dest):
+    with open(source, 'rb') as f_in, gzip.open(dest, 'wb') as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    os.remove(source)
+
+
+def configure_logging(app):
+    """Sends `app.logger` records through a bounded queue to a background
+    QueueListener, which writes them to a rotating log file and mails
+    error digests to the ADMINS, so that logging never waits on disk or
+    SMTP inside a request"""
+    handlers = []
+    if app.config['MAIL_SERVER']:
+        auth = None
+        if app.config['MAIL_USERNAME'] or app.config['MAIL_PASSWORD']:
+            auth = (app.config['MAIL_USERNAME'], app.config['MAIL_PASSWORD'])
+        secure = None
+        if app.config['MAIL_USE_TLS']:
+            secure = ()
+        mail_handler = DigestMailHandler(
+            mailhost=(app.config['MAIL_SERVER'], app.config['MAIL_PORT']),
+            fromaddr='no-reply@' + app.config['MAIL_SERVER'],
+            toaddrs=app.config['ADMINS'], subject='TechBlog Failure',
+            credentials=auth, secure=secure,
+            interval=app.config['LOG_MAIL_INTERVAL'],
+            max_entries=app.config['LOG_MAIL_MAX_ENTRIES'])
+        mail_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+        mail_handler.setLevel(logging.ERROR)
+        handlers.append(mail_handler)
+
+    if not os.path.exists('logs'):
+        os.mkdir('logs')
+    file_handler = RotatingFileHandler(
+        'logs/techblog.log', maxBytes=app.config['LOG_MAX_BYTES'],
+        backupCount=app.config['LOG_BACKUP_COUNT'])
+    if app.config['LOG_COMPRESS']:
+        file_handler.namer = lambda name: name + '.gz'
+        file_handler.rotator = gzip_rotator
+    file_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    file_handler.setLevel(logging.INFO)
+    handlers.append(file_handler)
+
+    log_queue = queue.Queue(maxsize=app.config['LOG_QUEUE_SIZE'])
+    listener = QueueListener(log_queue, *handlers,
+                             respect_handler_level=True)
+    listener.start()
+
+    def stop():
+        listener.stop()
+        for handler in handlers:
+            handler.close()
+
+    atexit.register(stop)
+    reset_after_fork(listener, restart_listener)
+    app.logger.addHandler(DroppingQueueHandler(log_queue))
+    app.logger.setLevel(logging.INFO)
+    return listener
@@ -0,0 +1,323 @@
+import json
+from flask import render_template, flash, redirect, url_for, request, \
+    current_app, Response
+from app.forms import EditProfileForm, EmptyForm, PostForm
+from flask_login import current_user, login_required
+import sqlalchemy as sa
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.main import bp
+from app.models import User, Post, ArchivedPost, followers, with_authors
+from app.pagination import KeysetPagination
+from app.last_seen import last_seen
+from app.fragments import fragment_cache
+from app.user_cache import user_cache
+from app.usernames import username_index, complete_username
+from app.database import read_only
+from app.conditional import not_modified, add_validators
+from app.events import timeline_events, author_channel
+
+
+def paginate_posts(query, keys, endpoint, tiers=(), **values):
+    """Paginates a Posts query for `endpoint`.
+    Uses keyset pagination on `keys` when KEYSET_PAGINATION is set,
+    OFFSET pages otherwise. Pages running past the end of `query`
+    continue into the (query, keys) pairs of `tiers`, e.g. ArchivedPosts.
+    Returns the Posts and the next/prev urls"""
+    per_page = current_app.config['POSTS_PER_PAGE']
+    # the pages show every Post's author
+    query = with_authors(query)
+    tiers = [(with_authors(tier_query), tier_keys)
+             for tier_query, tier_keys in tiers]
+    if current_app.config['KEYSET_PAGINATION']:
+        posts = KeysetPagination(query, keys, request.args.get('cursor'),
+                                 per_page, tiers=tiers)
+        next_url = url_for(endpoint, cursor=posts.next_cursor, **values) \
+            if posts.next_cursor else None
+        prev_url = url_for(endpoint, cursor=posts.prev_cursor, **values) \
+            if posts.prev_cursor else None
+        return posts.items, next_url, prev_url
+    page = max(request.args.get('page', 1, type=int), 1)
+    items = []
+    # rows of the tiers before the page still to be skipped
+    skip = (page - 1) * per_page
+    for tier_query, tier_keys in [(query, keys), *tiers]:
+        rows = db.session.scalars(
+            tier_query.order_by(None)
+            .order_by(*[key.desc() for key in tier_keys])
+            .offset(skip).limit(per_page + 1 - len(items))).all()
+        items.extend(rows)
+        if len(items) > per_page:
+            break
+        if rows or not skip:
+            skip = 0
+        else:
+            skip -= db.session.scalar(sa.select(sa.func.count()).select_from(
+                tier_query.order_by(None).subquery()))
+            skip = max(skip, 0)
+    next_url = url_for(endpoint, page=page + 1, **values) \
+        if len(items) > per_page else None
+    prev_url = url_for(endpoint, page=page - 1, **values) \
+        if page > 1 else None
+    return items[:per_page], next_url, prev_url
+
+
+bp.after_request(add_validators)
+
+
+def latest_post(*criteria):
+    """Returns the (id, timestamp) of the newest Post matching
+    `criteria`, a cheap validator for the pages listing them"""
+    row = db.session.execute(
+        sa.select(Post.id, Post.timestamp).where(*criteria)
+        .order_by(Post.timestamp.desc(), Post.id.desc()).limit(1)).first()
+    return tuple(row) if row else (None, None)
+
+
+def newest_rename():
+    """Returns the highest `profile_version`, which changes whenever any
+    User is renamed (see `User.renamed`)"""
+    return db.session.scalar(sa.select(sa.func.max(User.profile_version)))
+
+
+def timeline_validators(user):
+    """Returns validators for the Home Timeline of `user`, with an index
+    seek or two however many Users they follow: their `timeline_version`,
+    bumped by follows and fan-out, and the newest Post of the Users read
+    on demand, or of anyone when timelines are not materialized.
+    Follows do not change any timestamp, so the page has no
+    Last-Modified"""
+    version = db.session.scalar(
+        sa.select(User.timeline_version).where(User.id == user.id))
+    if not current_app.config['TIMELINE_MATERIALIZED']:
+        return version, latest_post(), newest_rename()
+    # one seek per author read on demand, of which there are few
+    newest = (
+        sa.select(Post.id).where(Post.user_id == User.id)
+        .order_by(Post.timestamp.desc(), Post.id.desc()).limit(1)
+        .scalar_subquery()
+    )
+    pulled = db.session.scalar(
+        sa.select(sa.func.max(newest)).where(User.pull_on_read))
+    return version, pulled, newest_rename()
+
+
+@bp.route('/', methods=['GET', 'POST'])
+@bp.route('/index', methods=['GET', 'POST'])
+@login_required
+def index():
+    """Renders the Index/Home Template to the 
+    Homepage API endpoint of the app"""
+    form = PostForm()
+    if form.validate_on_submit():
+        post = Post(body=form.post.data, author=current_user)
+        db.session.add(post)
+        current_user.update_counts(num_posts=1)
+        post.fan_out()
+        db.session.commit()
+        timeline_events.publish_post(post)
+        flash('Felicitations!, Your Musings are now Live')
+        return redirect(url_for('main.index'))
+    suggestions = current_user.who_to_follow()
+    response = not_modified(
+        timeline_validators(current_user),
+        [(user.id, user.profile_version) for user in suggestions])
+    if response:
+        return response
+    (query, keys), *tiers = current_user.timeline_tiers()
+    posts, next_url, prev_url = paginate_posts(query, keys, 'main.index',
+                                               tiers=tiers)
+    return render_template('index.html', title='Home Page', form=form,
+                           posts=posts, next_url=next_url,
+                           prev_url=prev_url,
+                           suggestions=suggestions,
+                           events_url=url_for('main.timeline_stream'))
+
+
+@bp.route('/timeline/events')
+@login_required
+def timeline_stream():
+    """Server-sent events announcing new Posts on the User's timeline,
+    with a comment line every EVENTS_HEARTBEAT seconds to keep the
+    connection open. Answers 503 when the worker has no streams left"""
+    # the stream is closed after the app context has gone
+    events = timeline_events._get_current_object()
+    followed = db.session.scalars(sa.select(followers.c.followed_id).where(
+        followers.c.follower_id == current_user.id)).all()
+    subscription = events.subscribe(
+        [author_channel(id) for id in followed + [current_user.id]])
+    if subscription is None:
+        return Response(status=503, headers={'Retry-After': '60'})
+    heartbeat = current_app.config['EVENTS_HEARTBEAT']
+
+    def generate():
+        yield f'retry: {heartbeat * 1000}\n\n'
+        while True:
+            data = subscription.get(heartbeat)
+            if subscription.overflowed:
+                yield 'event: overflow\ndata: {}\n\n'
+                return
+            if data is None:
+                yield ': heartbeat\n\n'
+            else:
+                yield f'event: post\nid: {data["id"]}\n' \
+                    f'data: {json.dumps(data)}\n\n'
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache',
+                                 'X-Accel-Buffering': 'no'})
+    response.call_on_close(lambda: events.unsubscribe(subscription))
+    return response
+
+
+@bp.route('/user/<username>')
+@login_required
+@read_only
+def user(username):
+    """Route to Display a User Profile Page Dynamically"""
+    user = db.first_or_404(sa.select(User).where(User.username == username))
+    post_id, timestamp = latest_post(Post.user_id == user.id)
+    following = current_user.is_following(user) \
+        if current_user != user else None
+    response = not_modified(
+        post_id, user.id, user.profile_version, user.about_me,
+        user.last_seen, user.num_followers, user.num_following, following,
+        last_modified=max(filter(None, (timestamp, user.last_seen)),
+                          default=None))
+    if response:
+        return response
+    query = user.posts.select().order_by(Post.timestamp.desc())
+    archived = sa.select(ArchivedPost).where(ArchivedPost.user_id == user.id)
+    posts, next_url, prev_url = paginate_posts(
+        query, (Post.timestamp, Post.id), 'main.user',
+        tiers=[(archived, (ArchivedPost.timestamp, ArchivedPost.id))],
+        username=user.username)
+    form = EmptyForm()
+    suggestions = current_user.who_to_follow() \
+        if user == current_user else None
+    return render_template('user.html', user=user, posts=posts,
+                           next_url=next_url, prev_url=prev_url, form=form,
+                           suggestions=suggestions)
+
+
+@bp.before_app_request
+def before_request():
+    """Function to run before any request to load user last_seen utc time.
+    The update is buffered and written back in batches"""
+    if current_user.is_authenticated:
+        last_seen.touch(current_user)
+
+
+@bp.route('/edit_profile', methods=['GET', 'POST'])
+@login_required
+def edit_profile():
+    form = EditProfileForm(current_user.username)
+    if form.validate_on_submit():
+        old_username = current_user.username
+        if old_username != form.username.data:
+            current_user.username = form.username.data
+            current_user.renamed()
+            fragment_cache.invalidate_author(current_user)
+        current_user.about_me = form.about_me.data
+        user_cache.invalidate(current_user, db.session)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            flash('Please use a different username.')
+            return redirect(url_for('main.edit_profile'))
+        if old_username != current_user.username:
+            username_index.rename(old_username, current_user.username)
+        flash('Your Changes have been Saved.')
+        return redirect(url_for('main.edit_profile'))
+    elif request.method == 'GET':
+        form.username.data = current_user.username
+        form.about_me.data = current_user.about_me
+    return render_template('edit_profile.html', title='Edit Profile',
+                           form=form)
+
+
+@bp.route('/follow/<username>', methods=['POST'])
+@login_required
+def follow(username):
+    form = EmptyForm()
+    if form.validate_on_submit():
+        user = db.session.scalar(
+            sa.select(User).where(User.username == username))
+        if user is None:
+            flash(f'User {username} not found.')
+            return redirect(url_for('main.index'))
+        if user == current_user:
+            flash('You cannot follow yourself!')
+            return redirect(url_for('main.user', username=username))
+        current_user.follow(user)
+        db.session.commit()
+        flash(f'You are following {username}!')
+        return redirect(url_for('main.user', username=username))
+    else:
+        return redirect(url_for('main.index'))
+
+
+@bp.route('/unfollow/<username>', methods=['POST'])
+@login_required
+def unfollow(username):
+    form = EmptyForm()
+    if form.validate_on_submit():
+        user = db.session.scalar(
+            sa.select(User).where(User.username == username))
+        if user is None:
+            flash(f'User {username} not found.')
+            return redirect(url_for('main.index'))
+        if user == current_user:
+            flash('You cannot unfollow yourself!')
+            return redirect(url_for('main.user', username=username))
+        current_user.unfollow(user)
+        db.session.commit()
+        flash(f'You are not following {username}.')
+        return redirect(url_for('main.user', username=username))
+    else:
+        return redirect(url_for('main.index'))
+    
+
+@bp.route('/explore')
+@login_required
+@read_only
+def explore():
+    # every page moves along with a new Post or changes with a rename
+    response = not_modified(latest_post(), newest_rename())
+    if response:
+        return response
+    query = sa.select(Post).order_by(Post.timestamp.desc())
+    archived = sa.select(ArchivedPost)
+    posts, next_url, prev_url = paginate_posts(
+        query, (Post.timestamp, Post.id), 'main.explore',
+        tiers=[(archived, (ArchivedPost.timestamp, ArchivedPost.id))])
+    return render_template('index.html', title='Explore', posts=posts,
+                           next_url=next_url, prev_url=prev_url)
+
+
+@bp.route('/users/complete')
+@login_required
+def complete_users():
+    """Usernames starting with `q`, for mentions and follow search"""
+    q = request.args.get('q', '')
+    limit = min(request.args.get('limit', 10, type=int), 50)
+    if not q:
+        return {'usernames': []}
+    return {'usernames': complete_username(q, max(limit, 1))}
+
+
+@bp.route('/search')
+@login_required
+def search():
+    """Full-Text Search over Posts, best matches first"""
+    q = request.args.get('q', '')
+    posts = Post.search(q, request.args.get('cursor'),
+                        current_app.config['POSTS_PER_PAGE'])
+    next_url = url_for('main.search', q=q, cursor=posts.next_cursor) \
+        if posts.next_cursor else None
+    prev_url = url_for('main.search', q=q, cursor=posts.prev_cursor) \
+        if posts.prev_cursor else None
+    return render_template('search.html', title='Search', q=q,
+                           posts=posts.items, next_url=next_url,
+                           prev_url=prev_url)
@@ -0,0 +1,203 @@
+import threading
+import time
+from bisect import bisect_left
+import sqlalchemy as sa
+from flask import g, request, has_request_context, Response, current_app, \
+    has_app_context
+from flask import before_render_template, template_rendered
+from werkzeug.local import LocalProxy
+from app import db
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+class Histogram:
+    """A cumulative histogram in the shape Prometheus expects"""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.lock = threading.Lock()
+
+    def observe(self, value):
+        index = bisect_left(self.buckets, value)
+        with self.lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def samples(self):
+        with self.lock:
+            counts = list(self.counts)
+            total = self.sum
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            yield ('+Inf' if bound == float('inf') else repr(bound)), \
+                cumulative
+        yield 'sum', total
+        yield 'count', cumulative
+
+
+class Metrics:
+    """Per endpoint request metrics for this process, exported in the
+    Prometheus text format on /metrics.
+    Records total latency, SQL query count and time, and template render
+    time for every request, and logs queries slower than
+    SLOW_QUERY_THRESHOLD seconds with their parameters.
+    """
+
+    families = {
+        'techblog_request_duration_seconds':
+            ('Total request latency.', LATENCY_BUCKETS),
+        'techblog_request_queries':
+            ('SQL statements executed per request.', COUNT_BUCKETS),
+        'techblog_request_query_seconds':
+            ('Time spent in SQL per request.', LATENCY_BUCKETS),
+        'techblog_request_render_seconds':
+            ('Time spent rendering templates per request.', LATENCY_BUCKETS),
+    }
+
+    def __init__(self, app=None):
+        self.app = app
+        self.histograms = {}
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        """Hooks the SQL, template and request instrumentation into
+        `app` and adds the /metrics endpoint, unless METRICS_ENABLED is
+        off"""
+        self.app = app
+        app.extensions['metrics'] = self
+        if not app.config['METRICS_ENABLED']:
+            return
+        with app.app_context():
+            for engine in db.engines.values():
+                sa.event.listen(engine, 'before_cursor_execute',
+                                before_cursor_execute)
+                sa.event.listen(engine, 'after_cursor_execute',
+                                after_cursor_execute)
+                sa.event.listen(engine, 'handle_error', handle_error)
+        before_render_template.connect(on_before_render_template, app)
+        template_rendered.connect(on_template_rendered, app)
+        app.before_request(start_request_metrics)
+        app.teardown_request(record_request_metrics)
+        app.add_url_rule('/metrics', 'metrics_view', metrics_view)
+
+    def histogram(self, name, endpoint):
+        key = (name, endpoint)
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(
+                    key, Histogram(self.families[name][1]))
+        return histogram
+
+    def observe_request(self, endpoint, duration, queries, query_time,
+                        render_time):
+        self.histogram('techblog_request_duration_seconds',
+                       endpoint).observe(duration)
+        self.histogram('techblog_request_queries', endpoint).observe(queries)
+        self.histogram('techblog_request_query_seconds',
+                       endpoint).observe(query_time)
+        self.histogram('techblog_request_render_seconds',
+                       endpoint).observe(render_time)
+
+    def exposition(self):
+        """Renders every histogram in the Prometheus text format"""
+        lines = []
+        with self.lock:
+            histograms = sorted(self.histograms.items())
+        for name, (description, _) in self.families.items():
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} histogram')
+            for (family, endpoint), histogram in histograms:
+                if family != name:
+                    continue
+                for le, value in histogram.samples():
+                    if le in ('sum', 'count'):
+                        lines.append(
+                            f'{name}_{le}{{endpoint="{endpoint}"}} {value}')
+                    else:
+                        lines.append(f'{name}_bucket{{endpoint="{endpoint}",'
+                                     f'le="{le}"}} {value}')
+        startup_time = getattr(self.app, 'startup_time', None)
+        if startup_time is not None:
+            lines.append('# HELP techblog_startup_seconds '
+                         'Time taken by create_app in this process.')
+            lines.append('# TYPE techblog_startup_seconds gauge')
+            lines.append(f'techblog_startup_seconds {startup_time}')
+        return '\n'.join(lines) + '\n'
+
+
+# the current app's Metrics
+metrics = LocalProxy(lambda: current_app.extensions['metrics'])
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context,
+                          executemany):
+    conn.info.setdefault('query_start', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context,
+                         executemany):
+    duration = time.perf_counter() - conn.info['query_start'].pop()
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_queries += 1
+        g.metrics_query_time += duration
+    if has_app_context() and \
+            duration >= current_app.config['SLOW_QUERY_THRESHOLD']:
+        current_app.logger.warning(
+            'Slow query (%.3fs): %s; parameters: %.500r',
+            duration, statement, parameters)
+
+
+def handle_error(context):
+    if context.connection is not None:
+        starts = context.connection.info.get('query_start')
+        if starts:
+            starts.pop()
+
+
+def on_before_render_template(sender, template, context, **extra):
+    if has_request_context() and 'metrics_start' in g:
+        if g.metrics_render_depth == 0:
+            g.metrics_render_start = time.perf_counter()
+        g.metrics_render_depth += 1
+
+
+def on_template_rendered(sender, template, context, **extra):
+    if has_request_context() and 'metrics_start' in g:
+        g.metrics_render_depth -= 1
+        if g.metrics_render_depth == 0:
+            g.metrics_render_time += \
+                time.perf_counter() - g.metrics_render_start
+
+
+def start_request_metrics():
+    """Starts the per request counters"""
+    g.metrics_start = time.perf_counter()
+    g.metrics_queries = 0
+    g.metrics_query_time = 0.0
+    g.metrics_render_time = 0.0
+    g.metrics_render_depth = 0
+
+
+def record_request_metrics(error=None):
+    """Feeds the per request counters into the endpoint histograms"""
+    if 'metrics_start' not in g or request.endpoint == 'metrics_view':
+        return
+    metrics.observe_request(
+        request.endpoint or 'unmatched',
+        time.perf_counter() - g.pop('metrics_start'),
+        g.metrics_queries, g.metrics_query_time, g.metrics_render_time)
+
+
+def metrics_view():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.exposition(),
+                    mimetype='text/plain; version=0.0.4')
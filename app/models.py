@@ -1,13 +1,19 @@
 import jwt
-from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 from time import time
 import sqlalchemy as sa
 import sqlalchemy.orm as so
-from app import app, db, login
+from flask import current_app
+from app import db, login
 from flask_login import UserMixin
 from hashlib import md5
+from app.pagination import KeysetPagination
+from app.passwords import hasher
+from app.user_cache import user_cache
+from app.database import insert_ignore
+from app.search import post_fts, archive_fts, fts_available, fts_match, \
+    search_terms, like_pattern
 
 followers = sa.Table(
     'followers',
@@ -15,7 +21,35 @@ followers = sa.Table(
     sa.Column('follower_id', sa.Integer, sa.ForeignKey('user.id'),
               primary_key=True),
     sa.Column('followed_id', sa.Integer, sa.ForeignKey('user.id'),
-              primary_key=True)
+              primary_key=True),
+    sa.Index('ix_followers_followed_id_follower_id', 'followed_id',
+             'follower_id')
+)
+
+timeline = sa.Table(
+    'timeline',
+    db.metadata,
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'),
+              primary_key=True),
+    sa.Column('post_id', sa.Integer, sa.ForeignKey('post.id'),
+              primary_key=True),
+    sa.Column('author_id', sa.Integer, sa.ForeignKey('user.id'),
+              nullable=False),
+    sa.Column('timestamp', sa.DateTime, nullable=False),
+    sa.Index('ix_timeline_user_id_timestamp', 'user_id', 'timestamp',
+             'post_id'),
+    sa.Index('ix_timeline_user_id_author_id', 'user_id', 'author_id')
+)
+
+suggestions = sa.Table(
+    'suggestion',
+    db.metadata,
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('user.id'),
+              primary_key=True),
+    sa.Column('rank', sa.Integer, primary_key=True),
+    sa.Column('suggested_id', sa.Integer, sa.ForeignKey('user.id'),
+              nullable=False),
+    sa.Column('score', sa.Integer, nullable=False)
 )
 
 
@@ -32,6 +66,7 @@ class User(UserMixin, db.Model):
                                                 unique=True)
     email: so.Mapped[str] = so.mapped_column(sa.String(120), index=True,
                                              unique=True)
+    email_hash: so.Mapped[Optional[str]] = so.mapped_column(sa.String(32))
     password_hash: so.Mapped[Optional[str]] = so.mapped_column(sa.String(256))
 
     about_me: so.Mapped[Optional[str]] = so.mapped_column(sa.String(140))
@@ -39,6 +74,24 @@ class User(UserMixin, db.Model):
     last_seen: so.Mapped[Optional[datetime]] = so.mapped_column(
         default=lambda: datetime.now(timezone.utc))
 
+    pull_on_read: so.Mapped[bool] = so.mapped_column(
+        default=False, server_default=sa.false(), index=True)
+
+    num_followers: so.Mapped[int] = so.mapped_column(
+        default=0, server_default='0')
+    num_following: so.Mapped[int] = so.mapped_column(
+        default=0, server_default='0')
+    num_posts: so.Mapped[int] = so.mapped_column(
+        default=0, server_default='0')
+
+    # set past every other User's on a rename (see `renamed`), so that
+    # the highest one changes with any rename
+    profile_version: so.Mapped[int] = so.mapped_column(
+        default=0, server_default='0', index=True)
+    # bumped whenever the User's materialized timeline or follows change
+    timeline_version: so.Mapped[int] = so.mapped_column(
+        default=0, server_default='0')
+
     posts: so.WriteOnlyMapped['Post'] = so.relationship(
         back_populates='author')
     
@@ -59,27 +112,125 @@ class User(UserMixin, db.Model):
     def set_password(self, password: str):
         """Generates a password hash to be stored in the User
         table for a particular user"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = hasher.hash(password)
+        if self.id is not None:
+            user_cache.invalidate(self, db.session)
 
     def check_password(self, password: str):
         """Checks whether a password from user evaluates to the password_hash
         associated with their id"""
-        return check_password_hash(self.password_hash, password)
+        if self.password_hash is None:
+            return False
+        return hasher.verify(self.password_hash, password)
+
+    def password_needs_rehash(self):
+        """Checks whether the stored password_hash is weaker or older
+        than the configured PASSWORD_HASH_METHOD"""
+        return self.password_hash is not None and \
+            hasher.needs_rehash(self.password_hash)
     
+    @so.validates('email')
+    def validate_email(self, key, email):
+        """Keeps `email_hash` in step with the email so that
+        avatars can be rendered without hashing"""
+        self.email_hash = md5(email.lower().encode('utf-8')).hexdigest()
+        return email
+
     def avatar(self, size):
         """Fetches an Avatar to display as a User Profile Page"""
-        digest = md5(self.email.lower().encode('utf-8')).hexdigest()
+        digest = self.email_hash or \
+            md5(self.email.lower().encode('utf-8')).hexdigest()
         return f'https://www.gravatar.com/avatar/{digest}?d=identicon&s={size}'
     
     def follow(self, user):
-        """Allows a Unique User id to Follow another Unique User id"""
-        if not self.is_following(user):
-            self.following.add(user)
+        """Allows a Unique User id to Follow another Unique User id.
+        Returns whether the User was newly followed"""
+        return bool(self.follow_ids([user.id]))
 
     def unfollow(self, user):
-        """Allows a Unique User id to Unfollow another Unique User id"""
-        if self.is_following(user):
-            self.following.remove(user)
+        """Allows a Unique User id to Unfollow another Unique User id.
+        Returns whether the User was followed before"""
+        return bool(self.unfollow_ids([user.id]))
+
+    def follow_ids(self, ids):
+        """Follows every User in `ids` with one INSERT ... ON CONFLICT
+        DO NOTHING ... RETURNING, then updates the counters and the
+        materialized timeline of just the Users that were not followed
+        yet, with one statement each. Returns the ids newly followed"""
+        ids = set(ids)
+        ids.discard(self.id)
+        if not ids:
+            return []
+        insert = insert_ignore(db.session, followers)
+        if db.session.get_bind().dialect.insert_returning:
+            followed = db.session.scalars(
+                insert.from_select(['follower_id', 'followed_id'],
+                                   sa.select(sa.literal(self.id), User.id)
+                                   .where(User.id.in_(ids)))
+                .returning(followers.c.followed_id)).all()
+        else:
+            # without RETURNING, insert the missing follows one by one:
+            # each rowcount tells whether this request added the follow
+            followed = [
+                id for id in ids - self.followed_ids(ids)
+                if db.session.execute(insert.from_select(
+                    ['follower_id', 'followed_id'],
+                    sa.select(sa.literal(self.id), User.id)
+                    .where(User.id == id))).rowcount]
+        if followed:
+            self.update_follow_counts(followed, 1)
+            if current_app.config['TIMELINE_MATERIALIZED']:
+                self.backfill_timelines(followed)
+        return followed
+
+    def unfollow_ids(self, ids):
+        """Unfollows every User in `ids` with one DELETE ... IN, then
+        updates the counters and the materialized timeline of the Users
+        that were followed. Returns the ids unfollowed"""
+        ids = set(ids)
+        if not ids:
+            return []
+        delete = sa.delete(followers).where(
+            followers.c.follower_id == self.id)
+        if db.session.get_bind().dialect.delete_returning:
+            unfollowed = db.session.scalars(
+                delete.where(followers.c.followed_id.in_(ids))
+                .returning(followers.c.followed_id)).all()
+        else:
+            unfollowed = [
+                id for id in self.followed_ids(ids)
+                if db.session.execute(
+                    delete.where(followers.c.followed_id == id)).rowcount]
+        if unfollowed:
+            self.update_follow_counts(unfollowed, -1)
+            if current_app.config['TIMELINE_MATERIALIZED']:
+                self.trim_timelines(unfollowed)
+        return unfollowed
+
+    def followed_ids(self, ids):
+        """Returns the ids in `ids` of the Users this User follows"""
+        return set(db.session.scalars(
+            sa.select(followers.c.followed_id)
+            .where(followers.c.follower_id == self.id,
+                   followers.c.followed_id.in_(ids))))
+
+    def update_follow_counts(self, ids, delta):
+        """Adds `delta` follows by this User to the Users in `ids`"""
+        self.update_counts(num_following=delta * len(ids),
+                           timeline_version=1)
+        db.session.execute(
+            sa.update(User).where(User.id.in_(ids))
+            .values(num_followers=User.num_followers + delta)
+            .execution_options(synchronize_session=False))
+        user_cache.invalidate_ids(ids, db.session)
+
+    @staticmethod
+    def ids_for_usernames(usernames):
+        """Resolves `usernames` with one query.
+        Returns a {username: id} dict of the Users that exist"""
+        return dict(db.session.execute(
+            sa.select(User.username, User.id)
+            .where(User.username.in_(set(usernames)))).all())
     
     def is_following(self, user):
         """Checks whether a Unique User id is
@@ -89,51 +240,261 @@ class User(UserMixin, db.Model):
     
     def followers_count(self):
         """Returns the number of User ids that follow a unique User id"""
-        query = sa.select(sa.func.count()).select_from(
-            self.followers.select().subquery())
-        return db.session.scalar(query)
+        return self.num_followers
     
     def following_count(self):
         """Returns the number of User ids that are following a Unique User id"""
-        query = sa.select(sa.func.count()).select_from(
-            self.following.select().subquery())
-        return db.session.scalar(query)
+        return self.num_following
+
+    def posts_count(self):
+        """Returns the number of Posts written by a Unique User id"""
+        return self.num_posts
+
+    def update_counts(self, **deltas):
+        """Atomically adds `deltas` to the User's counter columns,
+        e.g. `update_counts(num_followers=1)`.
+        The increment runs in SQL so concurrent writers cannot lose
+        updates, and the in-session object is kept in step"""
+        db.session.execute(
+            sa.update(User).where(User.id == self.id).values(
+                {getattr(User, name): getattr(User, name) + delta
+                 for name, delta in deltas.items()}))
+        user_cache.invalidate(self, db.session)
+
+    def renamed(self):
+        """Moves the User's `profile_version` past every other User's,
+        in SQL as the in-session User may come from the `user_cache`"""
+        newest = sa.select(
+            sa.func.max(User.profile_version).label('version')).subquery()
+        self.profile_version = \
+            sa.select(newest.c.version + 1).scalar_subquery()
+
+    @staticmethod
+    def reconcile_counts(first_id, last_id):
+        """Recomputes the counter columns of Users with ids in
+        [first_id, last_id] from the `followers`, `post` and
+        `post_archive` tables"""
+        num_followers = (
+            sa.select(sa.func.count()).select_from(followers)
+            .where(followers.c.followed_id == User.id)
+            .scalar_subquery()
+        )
+        num_following = (
+            sa.select(sa.func.count()).select_from(followers)
+            .where(followers.c.follower_id == User.id)
+            .scalar_subquery()
+        )
+        num_posts = (
+            sa.select(sa.func.count()).select_from(Post)
+            .where(Post.user_id == User.id)
+            .scalar_subquery()
+        ) + (
+            sa.select(sa.func.count()).select_from(ArchivedPost)
+            .where(ArchivedPost.user_id == User.id)
+            .scalar_subquery()
+        )
+        return db.session.execute(
+            sa.update(User)
+            .where(User.id.between(first_id, last_id))
+            .values(num_followers=num_followers,
+                    num_following=num_following, num_posts=num_posts)
+            .execution_options(synchronize_session=False)
+        ).rowcount
     
-    def following_posts(self):
-        """Returns Posts written by Users the User id
-        associated with a User Follows
+    def timeline_tiers(self):
+        """Returns the User's Home Timeline as (query, keys) tiers in page
+        order, for `paginate_posts`: with TIMELINE_MATERIALIZED the
+        materialized timeline back to the `timeline_horizon`, then the
+        older Posts read on demand; then the ArchivedPosts"""
+        tiers = []
+        plan = self.timeline_plan()
+        if current_app.config['TIMELINE_MATERIALIZED']:
+            horizon = timeline_horizon()
+            tiers.append(self.timeline_posts(horizon))
+            query, keys = self.followed_posts(plan=plan)
+            tiers.append((query.where(keys[0] < horizon), keys))
+        else:
+            tiers.append(self.followed_posts(plan=plan))
+        tiers.append(self.followed_posts(ArchivedPost, plan))
+        return tiers
+
+    def timeline_plan(self):
+        """Picks how `followed_posts` reads the Posts of the User and the
+        Users they follow, as a (plan, author ids) pair:
+        'merge' reads each author's Posts newest first from the
+        (user_id, timestamp, id) index and merges them, for fewer than
+        TIMELINE_MERGE_AUTHORS followed Users. Past that, 'seek' reads
+        all their Posts from that index and sorts them, and 'walk' reads
+        the (timestamp, id) index newest first until a page is full,
+        whichever reads fewer rows for how much the authors write"""
+        config = current_app.config
+        limit = config['TIMELINE_MERGE_AUTHORS']
+        followed = sa.select(followers.c.followed_id).where(
+            followers.c.follower_id == self.id)
+        if self.num_following < limit:
+            ids = db.session.scalars(followed.limit(limit)).all()
+            if len(ids) < limit:
+                return 'merge', [self.id, *ids]
+        authored = self.num_posts + (db.session.scalar(
+            sa.select(sa.func.sum(User.num_posts))
+            .where(User.id.in_(followed))) or 0)
+        total = db.session.scalar(sa.select(sa.func.max(Post.id))) or 0
+        # a walk reads about one row in `total / authored` into the page,
+        # a seek every one of the `authored` rows
+        if authored ** 2 > config['POSTS_PER_PAGE'] * total:
+            return 'walk', None
+        return 'seek', None
+
+    def followed_posts(self, model=None, plan=None):
+        """Returns the (query, keys) pair of the Posts, or rows of
+        another `model` such as ArchivedPost, written by the User and
+        the Users they follow, newest first, read without the
+        materialized timeline by the `timeline_plan`"""
+        model = model or Post
+        plan, author_ids = plan or self.timeline_plan()
+        if plan == 'merge':
+            # a UNION ALL of index ranges, which SQLite merges in order
+            posts = so.aliased(model, sa.union_all(*[
+                sa.select(model).where(model.user_id == author_id)
+                for author_id in author_ids]).subquery())
+            query = sa.select(posts)
+        else:
+            followed = sa.select(followers.c.followed_id).where(
+                followers.c.follower_id == self.id)
+            # `+ 0` keeps SQLite off the author index, to walk the
+            # (timestamp, id) index instead
+            author_id = model.user_id + 0 if plan == 'walk' \
+                else model.user_id
+            posts = model
+            query = sa.select(model).where(
+                sa.or_(author_id.in_(followed), author_id == self.id))
+        return (query.order_by(posts.timestamp.desc(), posts.id.desc()),
+                (posts.timestamp, posts.id))
+
+    def timeline_posts(self, horizon=None):
+        """Returns the (query, keys) pair of the User's Home Timeline
+        from the materialized `timeline` table, merging in Posts from
+        followed Users that are read on demand (see `Post.fan_out`),
+        limited to Posts written since `horizon`
         """
-        Author = so.aliased(User)
-        Follower = so.aliased(User)
-        return(
+        entries = sa.select(timeline.c.post_id).where(
+            timeline.c.user_id == self.id)
+        if horizon is not None:
+            entries = entries.where(timeline.c.timestamp >= horizon)
+        if self.following_pulled():
+            pulled = (
+                sa.select(Post.id)
+                .join(followers, followers.c.followed_id == Post.user_id)
+                .join(User, User.id == Post.user_id)
+                .where(followers.c.follower_id == self.id,
+                       User.pull_on_read)
+            )
+            if horizon is not None:
+                pulled = pulled.where(Post.timestamp >= horizon)
+            ids = sa.union(entries, pulled).subquery()
+            return (
+                sa.select(Post)
+                .join(ids, ids.c.post_id == Post.id)
+                .order_by(Post.timestamp.desc(), Post.id.desc())
+            ), (Post.timestamp, Post.id)
+        query = (
             sa.select(Post)
-            .join(Post.author.of_type(Author))
-            .join(Author.followers.of_type(Follower), isouter=True)
-            .where(sa.or_(
-                Follower.id == self.id,
-                Author.id == self.id,
-            ))
-            .group_by(Post)
-            .order_by(Post.timestamp.desc())
+            .join(timeline, timeline.c.post_id == Post.id)
+            .where(timeline.c.user_id == self.id)
+            .order_by(timeline.c.timestamp.desc(), timeline.c.post_id.desc())
         )
-    
+        if horizon is not None:
+            query = query.where(timeline.c.timestamp >= horizon)
+        return query, (timeline.c.timestamp, timeline.c.post_id)
+
+    def following_pulled(self):
+        """Checks whether the User follows anyone whose Posts
+        are not fanned out to their followers"""
+        query = (
+            sa.select(followers.c.followed_id)
+            .join(User, User.id == followers.c.followed_id)
+            .where(followers.c.follower_id == self.id, User.pull_on_read)
+            .limit(1)
+        )
+        return db.session.scalar(query) is not None
+
+    def backfill_timelines(self, ids):
+        """Copies the Posts since the `timeline_horizon` of each newly
+        followed User in `ids` into this User's materialized timeline"""
+        User.insert_timelines(
+            sa.select(sa.literal(self.id).label('user_id'),
+                      User.id.label('author_id'))
+            .where(User.id.in_(ids), ~User.pull_on_read))
+
+    @staticmethod
+    def insert_timelines(pairs):
+        """Copies the Posts since the `timeline_horizon` into materialized
+        timelines with one INSERT ... SELECT, for the (user_id,
+        author_id) rows of the `pairs` query"""
+        pairs = pairs.subquery()
+        db.session.execute(
+            sa.insert(timeline).from_select(
+                ['user_id', 'post_id', 'author_id', 'timestamp'],
+                sa.select(pairs.c.user_id, Post.id, Post.user_id,
+                          Post.timestamp)
+                .join(pairs, pairs.c.author_id == Post.user_id)
+                .where(Post.timestamp >= timeline_horizon())))
+
+    def trim_timelines(self, ids):
+        """Removes the Posts of the unfollowed Users in `ids` from this
+        User's materialized timeline"""
+        db.session.execute(
+            sa.delete(timeline).where(timeline.c.user_id == self.id,
+                                      timeline.c.author_id.in_(ids)))
+
+    def who_to_follow(self, limit=5):
+        """Returns the User's precomputed follow suggestions (see
+        `flask suggestions rebuild`), best first, skipping Users they
+        have followed since the suggestions were computed"""
+        followed = sa.select(followers.c.followed_id).where(
+            followers.c.follower_id == self.id,
+            followers.c.followed_id == suggestions.c.suggested_id)
+        return db.session.scalars(
+            sa.select(User)
+            .join(suggestions, suggestions.c.suggested_id == User.id)
+            .where(suggestions.c.user_id == self.id, ~followed.exists())
+            .order_by(suggestions.c.rank)
+            .limit(limit)).all()
+
     def get_reset_password_token(self, expires_in=600):
         """Returns a JWT token as a string"""
         return jwt.encode(
             {'reset_password': self.id, 'exp': time() + expires_in},
-            app.config['SECRET_KET'], algorithm='HS256'
+            current_app.config['SECRET_KEY'], algorithm='HS256'
         )
     
     @staticmethod
     def verify_reset_password_token(token):
         """Takes a JWT token and attempts to decode it."""
         try:
-            id = jwt.decode(token, app.config['SECRET_KEY'],
+            id = jwt.decode(token, current_app.config['SECRET_KEY'],
                             algorithms=['HS256'])['reset_password']
         except:
             return
         return db.session.get(User, id)
 
+    def get_api_token(self, expires_in=3600):
+        """Returns a JWT bearer token for the JSON API"""
+        return jwt.encode(
+            {'api': self.id, 'exp': time() + expires_in},
+            current_app.config['SECRET_KEY'], algorithm='HS256'
+        )
+
+    @staticmethod
+    def verify_api_token(token):
+        """Takes an API bearer token and returns its User, if valid"""
+        try:
+            id = jwt.decode(token, current_app.config['SECRET_KEY'],
+                            algorithms=['HS256'])['api']
+        except (jwt.InvalidTokenError, KeyError):
+            return
+        return db.session.get(User, id)
+
 class Post(db.Model):
     """Database Model Table for Blog Posts.
     Implements a `post` table to have the following;
@@ -145,17 +506,166 @@ class Post(db.Model):
     id: so.Mapped[int] = so.mapped_column(primary_key=True)
     body: so.Mapped[str] = so.mapped_column(sa.String(140))
     timestamp: so.Mapped[datetime] = so.mapped_column(
-        index=True, default=lambda: datetime.now(timezone.utc))
-    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id),
-                                               index=True)
+        default=lambda: datetime.now(timezone.utc))
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id))
+
+    # newest first pages of explore and of one author
+    __table_args__ = (
+        sa.Index('ix_post_timestamp_id', 'timestamp', 'id'),
+        sa.Index('ix_post_user_id_timestamp_id', 'user_id', 'timestamp',
+                 'id'),
+    )
     
     author: so.Mapped[User] = so.relationship(back_populates='posts')
 
     def __repr__(self):
         return '<Post {}>'.format(self.body)
-    
+
+    API_FIELDS = ('id', 'body', 'timestamp', 'author', 'author_avatar')
+
+    def to_dict(self, fields=API_FIELDS):
+        """Serializes the Post for the JSON API, limited to `fields`"""
+        data = {}
+        if 'id' in fields:
+            data['id'] = self.id
+        if 'body' in fields:
+            data['body'] = self.body
+        if 'timestamp' in fields:
+            data['timestamp'] = self.timestamp.replace(
+                tzinfo=timezone.utc).isoformat()
+        if 'author' in fields:
+            data['author'] = self.author.username
+        if 'author_avatar' in fields:
+            data['author_avatar'] = self.author.avatar(36)
+        return data
+
+    @staticmethod
+    def search(text, cursor=None, per_page=20):
+        """Returns a `KeysetPagination` of Posts containing every word in
+        `text`, best matches first, then the matching ArchivedPosts.
+        Uses the SQLite FTS5 indexes when they exist and falls back to
+        newest-first LIKE matching on other databases"""
+        terms = search_terms(text)
+        query = sa.select(Post).options(so.selectinload(Post.author))
+        archived = sa.select(ArchivedPost) \
+            .options(so.selectinload(ArchivedPost.author))
+        if not terms:
+            query = query.where(sa.false())
+            archived = archived.where(sa.false())
+        if terms and fts_available():
+            match = fts_match(terms)
+            query = query.join(post_fts, post_fts.c.rowid == Post.id) \
+                .where(post_fts.c.body.match(match))
+            archived = archived \
+                .join(archive_fts, archive_fts.c.rowid == ArchivedPost.id) \
+                .where(archive_fts.c.body.match(match))
+            return KeysetPagination(
+                query, (post_fts.c.rank, Post.id), cursor, per_page,
+                descending=False,
+                tiers=[(archived, (archive_fts.c.rank, ArchivedPost.id))])
+        for term in terms:
+            pattern = like_pattern(term)
+            query = query.where(Post.body.ilike(pattern, escape='\\'))
+            archived = archived.where(
+                ArchivedPost.body.ilike(pattern, escape='\\'))
+        return KeysetPagination(
+            query, (Post.timestamp, Post.id), cursor, per_page,
+            tiers=[(archived, (ArchivedPost.timestamp, ArchivedPost.id))])
+
+    def fan_out(self):
+        """Pushes a new Post into the materialized timelines of its
+        author and their followers.
+        Authors with more than TIMELINE_FANOUT_LIMIT followers are
+        switched to pull-on-read instead, their Posts are merged into
+        follower timelines when those are read
+        """
+        if not current_app.config['TIMELINE_MATERIALIZED']:
+            return
+        db.session.flush()
+        author = self.author
+        db.session.execute(
+            sa.insert(timeline).values(user_id=author.id, post_id=self.id,
+                                       author_id=author.id,
+                                       timestamp=self.timestamp))
+        author.update_counts(timeline_version=1)
+        if not author.pull_on_read:
+            if author.followers_count() > \
+                    current_app.config['TIMELINE_FANOUT_LIMIT']:
+                author.pull_on_read = True
+                return
+            followed_by = sa.select(followers.c.follower_id).where(
+                followers.c.followed_id == author.id)
+            db.session.execute(
+                sa.insert(timeline).from_select(
+                    ['post_id', 'author_id', 'timestamp', 'user_id'],
+                    sa.select(sa.literal(self.id), sa.literal(author.id),
+                              sa.literal(self.timestamp),
+                              followers.c.follower_id)
+                    .where(followers.c.followed_id == author.id)))
+            db.session.execute(
+                sa.update(User).where(User.id.in_(followed_by))
+                .values(timeline_version=User.timeline_version + 1)
+                .execution_options(synchronize_session=False))
+
+
+class ArchivedPost(db.Model):
+    """Database Model Table for archived Blog Posts.
+    Implements a `post_archive` table with the columns of `post`;
+    `flask posts archive` moves Posts older than a cutoff here, keeping
+    their ids, so that `post` and its indexes only hold the recent Posts
+    most pages read. Pages page through `post` first and only reach
+    `post_archive` once they run past its newest Post
+    """
+    __tablename__ = 'post_archive'
+
+    id: so.Mapped[int] = so.mapped_column(primary_key=True,
+                                          autoincrement=False)
+    body: so.Mapped[str] = so.mapped_column(sa.String(140))
+    timestamp: so.Mapped[datetime] = so.mapped_column()
+    user_id: so.Mapped[int] = so.mapped_column(sa.ForeignKey(User.id))
+
+    __table_args__ = (
+        sa.Index('ix_post_archive_timestamp_id', 'timestamp', 'id'),
+        sa.Index('ix_post_archive_user_id_timestamp_id', 'user_id',
+                 'timestamp', 'id'),
+    )
+
+    author: so.Mapped[User] = so.relationship()
+
+    def __repr__(self):
+        return '<ArchivedPost {}>'.format(self.body)
+
+    API_FIELDS = Post.API_FIELDS
+    to_dict = Post.to_dict
+
+
+def timeline_horizon():
+    """Returns the time materialized timelines go back to, TIMELINE_HORIZON
+    days ago. Older Posts are read on demand, so timelines are complete
+    whatever the horizon"""
+    return datetime.now(timezone.utc) - \
+        timedelta(days=current_app.config['TIMELINE_HORIZON'])
+
+
+def with_authors(query):
+    """Adds the loading of the authors of the Posts, or of the rows of
+    another entity such as ArchivedPost or an alias, that `query`
+    selects, with one more query per page"""
+    entity = query.column_descriptions[0]['entity']
+    return query.options(so.selectinload(entity.author))
+
+
 @login.user_loader
 def load_user(id):
     """Loads a User to be tracked by a Flask's
-    User session"""
-    return db.session.get(User, int(id))
\ No newline at end of file
+    User session, from the `user_cache` when possible"""
+    id = int(id)
+    data = user_cache.get(User, id)
+    if data is None:
+        user = db.session.get(User, id)
+        if user is not None:
+            user_cache.set(user)
+        return user
+    user = User(**data)
+    so.make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
\ No newline at end of file
@@ -0,0 +1,141 @@
+import base64
+import json
+from datetime import datetime
+import sqlalchemy as sa
+from app import db
+
+
+def encode_cursor(values, direction, tier=0):
+    """Packs a sort key, e.g. (timestamp, id), into an opaque URL safe token.
+    `tier` records which of the paginated queries the key belongs to"""
+    key = [{'dt': value.isoformat()} if isinstance(value, datetime) else value
+           for value in values]
+    data = {'k': key, 'd': direction}
+    if tier:
+        data['t'] = tier
+    data = json.dumps(data)
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """Unpacks a token made by `encode_cursor` into (values, direction,
+    tier).
+    Returns (None, 'next', 0) for a missing or malformed token so
+    that a bad cursor lands on the first page instead of erroring out"""
+    if not cursor:
+        return None, 'next', 0
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if not isinstance(data['k'], list):
+            raise ValueError(data['k'])
+        values = tuple(decode_value(value) for value in data['k'])
+        direction = data['d']
+        if direction not in ('next', 'prev'):
+            raise ValueError(direction)
+        tier = data.get('t', 0)
+        if not isinstance(tier, int) or tier < 0:
+            raise ValueError(tier)
+        return values, direction, tier
+    except (ValueError, TypeError, KeyError):
+        return None, 'next', 0
+
+
+def decode_value(value):
+    """Unpacks one value of a cursor's sort key, raising ValueError for
+    anything `encode_cursor` does not produce"""
+    if isinstance(value, dict) and isinstance(value.get('dt'), str):
+        return datetime.fromisoformat(value['dt'])
+    if isinstance(value, (int, float, str)) and not isinstance(value, bool):
+        return value
+    raise ValueError(value)
+
+
+class KeysetPagination:
+    """A page of results fetched by seeking on a sort key such as
+    (timestamp, id) rather than by OFFSET, so every page costs the same
+    to load.
+    Mirrors the parts of Flask-SQLAlchemy's `Pagination` the routes use,
+    with opaque `next_cursor`/`prev_cursor` tokens in place of page
+    numbers and no total count. `keys` are the columns to order on,
+    newest (or largest) first unless `descending` is False.
+    `tiers` are more (query, keys) pairs continuing the results past the
+    end of `query`, such as the ArchivedPosts; each is only read once a
+    page runs off the end of the one before or a cursor points into it.
+    Their keys need not follow on from those of the tier before, so a
+    tier can be ordered on a search rank of its own.
+    """
+
+    def __init__(self, query, keys, cursor=None, per_page=20,
+                 descending=True, tiers=()):
+        values, direction, tier = decode_cursor(cursor)
+        if values is not None and len(values) != len(keys):
+            values, direction, tier = None, 'next', 0
+        forward = (direction == 'next') != descending
+        # (query, keys, tier) in page order: the keys of each tier all
+        # come after those of the tier before
+        order = [(query, keys, 0)] + [
+            (tier_query, tier_keys, i)
+            for i, (tier_query, tier_keys) in enumerate(tiers, 1)]
+        if direction == 'prev':
+            order.reverse()
+        if values is not None:
+            while len(order) > 1 and order[0][2] != tier:
+                del order[0]
+        rows = []
+        start = values
+        for tier_query, tier_keys, i in order:
+            limit = per_page + 1 - len(rows)
+            if limit <= 0:
+                break
+            rows.extend(
+                (row[0], tuple(row[1:]), i)
+                for row in self.fetch(tier_query, tier_keys, start, forward,
+                                      limit))
+            # the tiers after the cursor's are read from their start
+            start = None
+        more = len(rows) > per_page
+        rows = rows[:per_page]
+        if direction == 'next':
+            self.has_next = more
+            self.has_prev = values is not None
+        else:
+            rows.reverse()
+            self.has_next = True
+            self.has_prev = more
+        self.items = [row[0] for row in rows]
+        self.keys = [row[1] for row in rows]
+        self.tiers = [row[2] for row in rows]
+        self.per_page = per_page
+
+    @classmethod
+    def fetch(cls, query, keys, values, forward, limit):
+        return db.session.execute(
+            cls.page_query(query, keys, values, forward, limit)).all()
+
+    @staticmethod
+    def page_query(query, keys, values=None, forward=False, limit=20):
+        """Builds the statement reading one page of `query` after the
+        key `values`, as run by KeysetPagination"""
+        query = query.order_by(None).add_columns(*keys)
+        if values is not None:
+            if forward:
+                query = query.where(sa.tuple_(*keys) > sa.tuple_(*values))
+            else:
+                query = query.where(sa.tuple_(*keys) < sa.tuple_(*values))
+        if forward:
+            query = query.order_by(*[key.asc() for key in keys])
+        else:
+            query = query.order_by(*[key.desc() for key in keys])
+        return query.limit(limit)
+
+    @property
+    def next_cursor(self):
+        if not self.has_next or not self.items:
+            return None
+        return encode_cursor(self.keys[-1], 'next', self.tiers[-1])
+
+    @property
+    def prev_cursor(self):
+        if not self.has_prev or not self.items:
+            return None
+        return encode_cursor(self.keys[0], 'prev', self.tiers[0])
@@ -0,0 +1,74 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from werkzeug.local import LocalProxy
+from werkzeug.security import generate_password_hash, check_password_hash
+from app.forks import reset_after_fork
+
+
+class PasswordHasher:
+    """Runs password hashing and verification on a small process pool,
+    so the CPU heavy key derivation does not hold the GIL in the
+    request thread.
+    PASSWORD_HASH_METHOD sets the Werkzeug method and cost, and
+    PASSWORD_HASH_WORKERS the pool size; 0 hashes inline.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.executor = None
+        self.method = None
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['hasher'] = self
+        reset_after_fork(self)
+
+    def after_fork(self):
+        # the pool's processes and threads belong to the parent
+        self.executor = None
+        self.lock = threading.Lock()
+
+    def pool(self):
+        with self.lock:
+            if self.executor is None:
+                # forking a threaded server can copy locks held by other
+                # threads into the workers, so start them fresh
+                self.executor = ProcessPoolExecutor(
+                    max_workers=self.app.config['PASSWORD_HASH_WORKERS'],
+                    mp_context=multiprocessing.get_context('spawn'))
+                atexit.register(self.executor.shutdown)
+            return self.executor
+
+    def run(self, func, *args):
+        if not self.app.config['PASSWORD_HASH_WORKERS']:
+            return func(*args)
+        return self.pool().submit(func, *args).result()
+
+    def hash(self, password):
+        """Returns a hash of `password` using PASSWORD_HASH_METHOD"""
+        return self.run(generate_password_hash, password,
+                        self.app.config['PASSWORD_HASH_METHOD'])
+
+    def verify(self, password_hash, password):
+        """Checks `password` against a stored hash"""
+        return self.run(check_password_hash, password_hash, password)
+
+    def needs_rehash(self, password_hash):
+        """Checks whether a stored hash was made with a method or cost
+        other than PASSWORD_HASH_METHOD"""
+        if self.method is None:
+            # Werkzeug writes the defaults into the hash, e.g. `scrypt` as
+            # `scrypt:32768:8:1`, so compare with a hash it made
+            self.method = generate_password_hash(
+                '', self.app.config['PASSWORD_HASH_METHOD']).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self.method
+
+
+# the current app's PasswordHasher
+hasher = LocalProxy(lambda: current_app.extensions['hasher'])
@@ -0,0 +1,83 @@
+import re
+import sys
+from datetime import datetime, timezone
+import sqlalchemy as sa
+from app import db
+from app.models import User, Post, ArchivedPost, followers, \
+    timeline_horizon
+from app.pagination import KeysetPagination
+
+# a table or index read in full, a skip-scan over the leading column of
+# an index, an index SQLite had to build on the fly, or a sort that no
+# index provides
+PLAN_PROBLEM = re.compile(
+    r'^SCAN (?!CONSTANT ROW)|\bANY\(|AUTOMATIC|USE TEMP B-TREE')
+# walking an index in page order, fine when every row read is on the page
+ORDERED_SCAN = re.compile(r'^SCAN \S+ USING (COVERING )?INDEX')
+
+
+def page_queries(name, query, keys, allowed=None):
+    """Yields the first and a later page of a paginated query"""
+    yield name, KeysetPagination.page_query(query, keys), allowed
+    cursor = (datetime.now(timezone.utc), sys.maxsize)
+    yield name + ' (cursor)', \
+        KeysetPagination.page_query(query, keys, cursor), allowed
+
+
+def plan_queries(user):
+    """Yields (name, statement, allowed) triples of the queries behind
+    the hot pages and the follower counts, as `user` would run them.
+    `allowed` matches the plan lines the query is expected to have
+    even though PLAN_PROBLEM does. Only the 'merge' timeline plan reads
+    in page order; the others are reported with their scan or sort"""
+    plan = user.timeline_plan()
+    yield from page_queries(f'timeline ({plan[0]})',
+                            *user.followed_posts(plan=plan))
+    yield from page_queries(f'timeline archive ({plan[0]})',
+                            *user.followed_posts(ArchivedPost, plan))
+    if not user.following_pulled():
+        yield from page_queries('materialized timeline',
+                                *user.timeline_posts(timeline_horizon()))
+    # nothing filters these, so every row walked is on the page
+    yield from page_queries('explore', sa.select(Post),
+                            (Post.timestamp, Post.id), ORDERED_SCAN)
+    yield from page_queries('explore archive', sa.select(ArchivedPost),
+                            (ArchivedPost.timestamp, ArchivedPost.id),
+                            ORDERED_SCAN)
+    yield from page_queries('user', user.posts.select(),
+                            (Post.timestamp, Post.id))
+    yield from page_queries(
+        'user archive',
+        sa.select(ArchivedPost).where(ArchivedPost.user_id == user.id),
+        (ArchivedPost.timestamp, ArchivedPost.id))
+    yield 'followers count', sa.select(sa.func.count()).select_from(
+        followers).where(followers.c.followed_id == user.id), None
+    yield 'following count', sa.select(sa.func.count()).select_from(
+        followers).where(followers.c.follower_id == user.id), None
+    yield 'posts count', sa.select(sa.func.count()).select_from(Post) \
+        .where(Post.user_id == user.id), None
+    yield 'fan out', sa.select(followers.c.follower_id).where(
+        followers.c.followed_id == user.id), None
+    yield 'is following', \
+        user.following.select().where(User.id == user.id), None
+
+
+def query_plan(statement):
+    """Returns the lines of SQLite's EXPLAIN QUERY PLAN for `statement`"""
+    sql = statement.compile(dialect=db.engine.dialect,
+                            compile_kwargs={'literal_binds': True})
+    rows = db.session.execute(sa.text(f'EXPLAIN QUERY PLAN {sql}'))
+    return [row[3] for row in rows]
+
+
+def check_plans(user):
+    """Explains every query of `plan_queries`.
+    Returns (name, plan, problems) triples, where problems are the plan
+    lines showing a full scan or a temporary sort"""
+    results = []
+    for name, statement, allowed in plan_queries(user):
+        plan = query_plan(statement)
+        problems = [line for line in plan if PLAN_PROBLEM.search(line) and
+                    not (allowed and allowed.search(line))]
+        results.append((name, plan, problems))
+    return results
@@ -0,0 +1,96 @@
+import re
+import sqlalchemy as sa
+from flask import current_app
+from app import db
+
+post_fts = sa.table(
+    'post_fts',
+    sa.column('rowid', sa.Integer),
+    sa.column('body', sa.String),
+    sa.column('rank', sa.Float),
+)
+
+archive_fts = sa.table(
+    'post_archive_fts',
+    sa.column('rowid', sa.Integer),
+    sa.column('body', sa.String),
+    sa.column('rank', sa.Float),
+)
+
+FTS_DDL = [
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_fts USING fts5("
+    "body, content='post', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_ai AFTER INSERT ON post BEGIN "
+    "INSERT INTO post_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_ad AFTER DELETE ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, body) "
+    "VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS post_fts_au AFTER UPDATE ON post BEGIN "
+    "INSERT INTO post_fts(post_fts, rowid, body) "
+    "VALUES ('delete', old.id, old.body); "
+    "INSERT INTO post_fts(rowid, body) VALUES (new.id, new.body); END",
+    "CREATE VIRTUAL TABLE IF NOT EXISTS post_archive_fts USING fts5("
+    "body, content='post_archive', content_rowid='id')",
+    "CREATE TRIGGER IF NOT EXISTS post_archive_fts_ai AFTER INSERT ON "
+    "post_archive BEGIN "
+    "INSERT INTO post_archive_fts(rowid, body) VALUES (new.id, new.body); "
+    "END",
+    "CREATE TRIGGER IF NOT EXISTS post_archive_fts_ad AFTER DELETE ON "
+    "post_archive BEGIN "
+    "INSERT INTO post_archive_fts(post_archive_fts, rowid, body) "
+    "VALUES ('delete', old.id, old.body); END",
+    "CREATE TRIGGER IF NOT EXISTS post_archive_fts_au AFTER UPDATE ON "
+    "post_archive BEGIN "
+    "INSERT INTO post_archive_fts(post_archive_fts, rowid, body) "
+    "VALUES ('delete', old.id, old.body); "
+    "INSERT INTO post_archive_fts(rowid, body) "
+    "VALUES (new.id, new.body); END",
+]
+
+
+def fts_available():
+    """Checks whether the SQLite FTS5 indexes over `post.body` and
+    `post_archive.body` exist, remembering the answer on the current
+    app, so a worker started before they were created keeps searching
+    with LIKE until it restarts"""
+    available = current_app.extensions.get('post_fts')
+    if available is None:
+        available = db.engine.dialect.name == 'sqlite'
+        if available:
+            inspector = sa.inspect(db.engine)
+            available = inspector.has_table('post_fts') and \
+                inspector.has_table('post_archive_fts')
+        current_app.extensions['post_fts'] = available
+    return available
+
+
+def create_index():
+    """Creates the FTS5 tables and the triggers that keep them in sync"""
+    for statement in FTS_DDL:
+        db.session.execute(sa.text(statement))
+    current_app.extensions.pop('post_fts', None)
+
+
+def rebuild_index():
+    """Repopulates the FTS5 tables from the `post` and `post_archive`
+    tables"""
+    db.session.execute(
+        sa.text("INSERT INTO post_fts(post_fts) VALUES ('rebuild')"))
+    db.session.execute(sa.text(
+        "INSERT INTO post_archive_fts(post_archive_fts) VALUES ('rebuild')"))
+
+
+def search_terms(text):
+    """Splits user input into plain words, dropping any query syntax"""
+    return re.findall(r'\w+', text or '')
+
+
+def fts_match(terms):
+    """Builds an FTS5 query matching Posts that contain all of `terms`"""
+    return ' '.join('"{}"'.format(term) for term in terms)
+
+
+def like_pattern(term):
+    escaped = term.replace('\\', '\\\\').replace('%', '\\%') \
+        .replace('_', '\\_')
+    return '%{}%'.format(escaped)
@@ -0,0 +1,131 @@
+import heapq
+import random
+from array import array
+import sqlalchemy as sa
+from app import db
+from app.data import Progress
+from app.models import User, followers, suggestions
+
+
+class FollowGraph:
+    """The `followers` table as compressed sparse rows: the Users
+    followed by user id `u` are `targets[offsets[u]:offsets[u + 1]]`,
+    in id order. Ids index the arrays directly, so the graph takes
+    4 bytes per edge plus 8 bytes per user id, whatever the density"""
+
+    def __init__(self, max_id, num_edges):
+        self.max_id = max_id
+        self.offsets = array('i', bytes(4 * (max_id + 2)))
+        self.targets = array('i')
+        self.in_degree = array('i', bytes(4 * (max_id + 1)))
+        self.num_edges = num_edges
+
+    @staticmethod
+    def size(max_id, num_edges):
+        """Bytes needed for a graph of this size"""
+        return 4 * num_edges + 4 * (max_id + 2) + 4 * (max_id + 1)
+
+    @classmethod
+    def load(cls, chunk_size=10000):
+        """Streams `followers` in primary key order into a FollowGraph.
+        Users and follows added while it loads, past the `max_id` read
+        first, are left out"""
+        max_id = db.session.scalar(sa.select(sa.func.max(User.id))) or 0
+        num_edges = db.session.scalar(
+            sa.select(sa.func.count()).select_from(followers))
+        graph = cls(max_id, num_edges)
+        offsets, targets, in_degree = \
+            graph.offsets, graph.targets, graph.in_degree
+        query = sa.select(followers.c.follower_id, followers.c.followed_id) \
+            .where(followers.c.follower_id <= max_id,
+                   followers.c.followed_id <= max_id) \
+            .order_by(followers.c.follower_id, followers.c.followed_id) \
+            .execution_options(yield_per=chunk_size)
+        for follower, followed in db.session.execute(query):
+            offsets[follower + 1] += 1
+            targets.append(followed)
+            in_degree[followed] += 1
+        for i in range(1, len(offsets)):
+            offsets[i] += offsets[i - 1]
+        graph.num_edges = len(targets)
+        return graph
+
+    def following(self, user_id):
+        return self.targets[self.offsets[user_id]:self.offsets[user_id + 1]]
+
+
+def sample(ids, max_degree, rng):
+    if len(ids) <= max_degree:
+        return ids
+    return rng.sample(ids, max_degree)
+
+
+def score_user(graph, user_id, top_k, max_degree, popular, rng):
+    """Ranks the Users followed by the Users `user_id` follows, by how
+    many of them follow each candidate, then by follower count.
+    Hubs are sampled down to `max_degree` edges so the work per user
+    is bounded; Users with too few candidates get the most followed
+    Users instead. Returns up to `top_k` (suggested_id, score) pairs"""
+    following = graph.following(user_id)
+    excluded = set(following)
+    excluded.add(user_id)
+    counts = {}
+    for friend in sample(following, max_degree, rng):
+        for candidate in sample(graph.following(friend), max_degree, rng):
+            if candidate not in excluded:
+                counts[candidate] = counts.get(candidate, 0) + 1
+    in_degree = graph.in_degree
+    best = heapq.nlargest(top_k, counts.items(),
+                          key=lambda item: (item[1], in_degree[item[0]]))
+    if len(best) < top_k:
+        chosen = {candidate for candidate, _ in best}
+        for candidate in popular:
+            if candidate not in excluded and candidate not in chosen:
+                best.append((candidate, 0))
+                if len(best) == top_k:
+                    break
+    return best
+
+
+def rebuild_suggestions(top_k=10, max_degree=200, chunk_size=1000,
+                        max_memory=None, rng=None, report=print):
+    """Recomputes the `suggestion` table for every User.
+    Suggestions are replaced `chunk_size` Users per transaction, so
+    readers always see a complete list. Raises MemoryError if the graph
+    would need more than `max_memory` bytes. Returns the number of
+    Users and the number of suggestions written"""
+    rng = rng or random.Random()
+    max_id = db.session.scalar(sa.select(sa.func.max(User.id))) or 0
+    num_edges = db.session.scalar(
+        sa.select(sa.func.count()).select_from(followers))
+    needed = FollowGraph.size(max_id, num_edges)
+    if max_memory is not None and needed > max_memory:
+        raise MemoryError(f'The follower graph needs {needed} bytes')
+    graph = FollowGraph.load()
+    report(f'Loaded {graph.num_edges} follows of {max_id} user ids '
+           f'({needed / 2**20:.1f} MiB).')
+    popular = heapq.nlargest(top_k + max_degree, range(max_id + 1),
+                             key=graph.in_degree.__getitem__)
+    popular = [user_id for user_id in popular if graph.in_degree[user_id]]
+
+    user_ids = array('i', db.session.scalars(
+        sa.select(User.id).where(User.id <= graph.max_id).order_by(User.id)))
+    progress = Progress(report, chunk_size * 10)
+    num_rows = 0
+    for start in range(0, len(user_ids), chunk_size):
+        chunk = user_ids[start:start + chunk_size]
+        rows = []
+        for user_id in chunk:
+            for rank, (suggested_id, score) in enumerate(score_user(
+                    graph, user_id, top_k, max_degree, popular, rng)):
+                rows.append({'user_id': user_id, 'rank': rank,
+                             'suggested_id': suggested_id, 'score': score})
+        db.session.execute(sa.delete(suggestions).where(
+            suggestions.c.user_id.between(chunk[0], chunk[-1])))
+        if rows:
+            db.session.execute(sa.insert(suggestions), rows)
+        db.session.commit()
+        num_rows += len(rows)
+        progress.add(len(chunk))
+    progress.show()
+    return len(user_ids), num_rows
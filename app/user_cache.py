@@ -0,0 +1,208 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from werkzeug.local import LocalProxy
+from app.database import RoutingSession
+from app.forks import reset_after_fork
+
+# never cached, as a store may be a plain file outside the database;
+# a User loaded from the cache reads these from the database on access
+UNCACHED_COLUMNS = {'password_hash'}
+
+
+class LocalStore:
+    """A thread safe in-process LRU of `size` entries that expire
+    `ttl` seconds after they are set"""
+
+    def __init__(self, ttl, size):
+        self.ttl = ttl
+        self.size = size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            data, expires = entry
+            if expires <= time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        with self.lock:
+            self.entries[key] = data, time.monotonic() + self.ttl
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class SQLiteStore:
+    """A store in a local SQLite file that every worker process on the
+    host shares, so an invalidation in one worker is seen by all.
+    Entries expire `ttl` seconds after they are set; expired entries
+    are pruned once more than `size` are stored"""
+
+    def __init__(self, path, ttl, size):
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+        self.local = threading.local()
+        self.writes = 0
+        with self.connection() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS user_cache ('
+                         'id INTEGER PRIMARY KEY, data TEXT NOT NULL, '
+                         'expires REAL NOT NULL)')
+        reset_after_fork(self)
+
+    def after_fork(self):
+        # SQLite connections must not be used across a fork
+        self.local = threading.local()
+
+    def connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            self.local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self.connection().execute(
+            'SELECT data FROM user_cache WHERE id = ? AND expires > ?',
+            (key, time.time())).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def set(self, key, data):
+        conn = self.connection()
+        conn.execute('INSERT OR REPLACE INTO user_cache (id, data, expires) '
+                     'VALUES (?, ?, ?)',
+                     (key, json.dumps(data), time.time() + self.ttl))
+        self.writes += 1
+        if self.writes % 1000 == 0 and conn.execute(
+                'SELECT count(*) FROM user_cache').fetchone()[0] > self.size:
+            conn.execute('DELETE FROM user_cache WHERE expires <= ?',
+                         (time.time(),))
+
+    def delete(self, key):
+        self.connection().execute('DELETE FROM user_cache WHERE id = ?',
+                                  (key,))
+
+    def clear(self):
+        self.connection().execute('DELETE FROM user_cache')
+
+
+class UserCache:
+    """Caches the column values of session Users by id, but for the
+    UNCACHED_COLUMNS, so that `load_user` can rebuild `current_user`
+    without a query.
+    Entries live for USER_CACHE_TTL seconds (0 turns the cache off) in
+    a per-process LRU of USER_CACHE_SIZE entries, or, when
+    USER_CACHE_PATH is set, in a SQLite file shared by the workers.
+    `invalidate` drops a User at once and again when the session
+    commits, so a concurrent request cannot re-cache the old row.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.store = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['user_cache'] = self
+        ttl = app.config['USER_CACHE_TTL']
+        size = app.config['USER_CACHE_SIZE']
+        if not ttl:
+            self.store = None
+        elif app.config['USER_CACHE_PATH']:
+            self.store = SQLiteStore(app.config['USER_CACHE_PATH'], ttl, size)
+        else:
+            self.store = LocalStore(ttl, size)
+
+    def get(self, model, id):
+        """Returns the cached column values of `model` row `id`,
+        or None"""
+        if self.store is None:
+            return None
+        data = self.store.get(id)
+        if data is None:
+            return None
+        data = {key: value for key, value in data.items()
+                if key not in UNCACHED_COLUMNS}
+        for column in model.__table__.columns:
+            if isinstance(column.type, sa.DateTime) and \
+                    data.get(column.key) is not None:
+                data[column.key] = datetime.fromisoformat(data[column.key])
+        return data
+
+    def set(self, obj):
+        """Caches the column values of the loaded `obj`"""
+        if self.store is None:
+            return
+        data = {}
+        for column in obj.__table__.columns:
+            if column.key in UNCACHED_COLUMNS:
+                continue
+            value = getattr(obj, column.key)
+            data[column.key] = value.isoformat() \
+                if isinstance(value, datetime) else value
+        self.store.set(obj.id, data)
+
+    def invalidate(self, obj, session=None):
+        """Drops `obj` from the cache, now and after the commit of
+        `session`"""
+        self.invalidate_ids([obj.id], session)
+
+    def invalidate_ids(self, ids, session=None):
+        """Drops the Users with `ids` from the cache, now and after the
+        commit of `session`"""
+        if self.store is None:
+            return
+        self.discard(*ids)
+        if session is not None:
+            session.info.setdefault('user_cache_stale', set()).update(ids)
+
+    def discard(self, *ids):
+        """Drops the Users with `ids` from the cache"""
+        if self.store is None:
+            return
+        for id in ids:
+            self.store.delete(id)
+
+    def after_commit(self, session):
+        self.discard(*session.info.pop('user_cache_stale', ()))
+
+
+# the current app's UserCache
+user_cache = LocalProxy(lambda: current_app.extensions['user_cache'])
+
+
+@sa.event.listens_for(RoutingSession, 'after_commit')
+def invalidate_after_commit(session):
+    if has_app_context():
+        user_cache.after_commit(session)
+
+
+@sa.event.listens_for(RoutingSession, 'after_rollback')
+def forget_after_rollback(session):
+    session.info.pop('user_cache_stale', None)
@@ -0,0 +1,154 @@
+import threading
+import time
+from bisect import bisect_left, insort
+import sqlalchemy as sa
+from flask import current_app
+from werkzeug.local import LocalProxy
+from app import db
+from app.models import User
+
+
+class UsernameIndex:
+    """An in-memory index of every username and email, for availability
+    checks and case-insensitive username prefix lookups without a query.
+    Usernames are kept in a list sorted on their lowercased form, so a
+    prefix is a bisect and a short scan. The index loads in a background
+    thread on first use and reloads every USERNAME_INDEX_REFRESH seconds
+    to pick up changes made by other workers; lookups made while it is
+    cold return None and callers fall back to the database.
+    """
+
+    def __init__(self, app=None):
+        self.app = app
+        self.names = []
+        self.usernames = set()
+        self.emails = set()
+        self.lock = threading.Lock()
+        self.loaded_at = None
+        self.loading = False
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        self.app = app
+        app.extensions['username_index'] = self
+
+    def ready(self):
+        """Checks whether the index is loaded, starting a (re)load
+        when it is missing or older than USERNAME_INDEX_REFRESH"""
+        refresh = self.app.config['USERNAME_INDEX_REFRESH']
+        with self.lock:
+            stale = self.loaded_at is None or \
+                time.monotonic() - self.loaded_at > refresh
+            if stale and not self.loading:
+                self.loading = True
+                threading.Thread(target=self.load, daemon=True,
+                                 name='username-index').start()
+            return self.loaded_at is not None
+
+    def load(self):
+        """Reads every username and email from the database"""
+        names, usernames, emails = [], set(), set()
+        try:
+            with self.app.app_context():
+                query = sa.select(User.username, User.email) \
+                    .execution_options(yield_per=10000)
+                for username, email in db.session.execute(query):
+                    names.append((username.lower(), username))
+                    usernames.add(username)
+                    emails.add(email)
+        except Exception:
+            self.app.logger.exception('Failed to load the username index')
+            with self.lock:
+                self.loading = False
+            return
+        names.sort()
+        with self.lock:
+            self.names, self.usernames, self.emails = names, usernames, emails
+            self.loaded_at = time.monotonic()
+            self.loading = False
+
+    def add(self, user):
+        """Adds a newly registered User"""
+        with self.lock:
+            if user.username not in self.usernames:
+                insort(self.names, (user.username.lower(), user.username))
+                self.usernames.add(user.username)
+            self.emails.add(user.email)
+
+    def rename(self, old_username, new_username):
+        with self.lock:
+            key = (old_username.lower(), old_username)
+            i = bisect_left(self.names, key)
+            if i < len(self.names) and self.names[i] == key:
+                del self.names[i]
+            self.usernames.discard(old_username)
+            insort(self.names, (new_username.lower(), new_username))
+            self.usernames.add(new_username)
+
+    def username_taken(self, username):
+        """Returns whether `username` is in use, or None when cold"""
+        if not self.ready():
+            return None
+        with self.lock:
+            return username in self.usernames
+
+    def email_taken(self, email):
+        """Returns whether `email` is in use, or None when cold"""
+        if not self.ready():
+            return None
+        with self.lock:
+            return email in self.emails
+
+    def complete(self, prefix, limit=10):
+        """Returns up to `limit` usernames starting with `prefix`,
+        ignoring case, in order, or None when cold"""
+        if not self.ready():
+            return None
+        prefix = prefix.lower()
+        with self.lock:
+            i = bisect_left(self.names, (prefix,))
+            matches = []
+            for key, username in self.names[i:i + limit]:
+                if not key.startswith(prefix):
+                    break
+                matches.append(username)
+            return matches
+
+
+# the current app's UsernameIndex
+username_index = LocalProxy(lambda: current_app.extensions['username_index'])
+
+
+def username_taken(username):
+    """Checks `username` against the index, or the database when the
+    index is cold"""
+    taken = username_index.username_taken(username)
+    if taken is None:
+        taken = db.session.scalar(
+            sa.select(User.id).where(User.username == username)) is not None
+    return taken
+
+
+def email_taken(email):
+    """Checks `email` against the index, or the database when the
+    index is cold"""
+    taken = username_index.email_taken(email)
+    if taken is None:
+        taken = db.session.scalar(
+            sa.select(User.id).where(User.email == email)) is not None
+    return taken
+
+
+def complete_username(prefix, limit=10):
+    """Usernames starting with `prefix`, from the index or, when it is
+    cold, from a range scan on `ix_user_username` (which, unlike the
+    index, matches case-sensitively)"""
+    matches = username_index.complete(prefix, limit)
+    if matches is None:
+        matches = db.session.scalars(
+            sa.select(User.username)
+            .where(User.username >= prefix,
+                   User.username < prefix + '\U0010ffff')
+            .order_by(User.username).limit(limit)).all()
+    return matches
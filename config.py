@@ -7,10 +7,75 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY') or 'a_pretty_strong_password'
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL') or \
         'sqlite:///' + os.path.join(basedir, 'app.db')
+    SQLALCHEMY_BINDS = {'read': os.environ['DATABASE_READ_URL']} \
+        if os.environ.get('DATABASE_READ_URL') else {}
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        name: int(os.environ[var]) for name, var in (
+            ('pool_size', 'DATABASE_POOL_SIZE'),
+            ('max_overflow', 'DATABASE_MAX_OVERFLOW'),
+            ('pool_timeout', 'DATABASE_POOL_TIMEOUT'),
+            ('pool_recycle', 'DATABASE_POOL_RECYCLE'),
+        ) if os.environ.get(var)
+    }
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS') or 'NORMAL'
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE') or 268435456)
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT') or 5000)
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
     MAIL_USE_TLS = os.environ.get('MAIL_USE_TLS') is not None
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
+    MAIL_WORKERS = int(os.environ.get('MAIL_WORKERS') or 2)
+    MAIL_QUEUE_SIZE = int(os.environ.get('MAIL_QUEUE_SIZE') or 1000)
+    MAIL_BATCH_SIZE = int(os.environ.get('MAIL_BATCH_SIZE') or 50)
+    MAIL_ENQUEUE_TIMEOUT = float(os.environ.get('MAIL_ENQUEUE_TIMEOUT') or 5)
+    MAIL_MAX_RETRIES = int(os.environ.get('MAIL_MAX_RETRIES') or 3)
+    MAIL_RETRY_BACKOFF = float(os.environ.get('MAIL_RETRY_BACKOFF') or 1)
+    MAIL_DRAIN_TIMEOUT = float(os.environ.get('MAIL_DRAIN_TIMEOUT') or 30)
     ADMINS = ['some-email@example.com']
-    POSTS_PER_PAGE = 25
\ No newline at end of file
+    LOG_QUEUE_SIZE = int(os.environ.get('LOG_QUEUE_SIZE') or 10000)
+    LOG_MAX_BYTES = int(os.environ.get('LOG_MAX_BYTES') or 10 * 1024 * 1024)
+    LOG_BACKUP_COUNT = int(os.environ.get('LOG_BACKUP_COUNT') or 10)
+    LOG_COMPRESS = os.environ.get('LOG_COMPRESS') is not None
+    LOG_MAIL_INTERVAL = int(os.environ.get('LOG_MAIL_INTERVAL') or 300)
+    LOG_MAIL_MAX_ENTRIES = int(os.environ.get('LOG_MAIL_MAX_ENTRIES') or 50)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD') or \
+        'scrypt:32768:8:1'
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS') or
+                                min(os.cpu_count() or 1, 4))
+    POSTS_PER_PAGE = 25
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL') or 60)
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE') or 10000)
+    USER_CACHE_PATH = os.environ.get('USER_CACHE_PATH')
+    USERNAME_INDEX_REFRESH = int(
+        os.environ.get('USERNAME_INDEX_REFRESH') or 300)
+    JINJA_BYTECODE_CACHE_DIR = os.environ.get('JINJA_BYTECODE_CACHE_DIR')
+    API_MAX_PER_PAGE = int(os.environ.get('API_MAX_PER_PAGE') or 500)
+    API_MAX_FOLLOWS = int(os.environ.get('API_MAX_FOLLOWS') or 1000)
+    API_TOKEN_EXPIRATION = int(os.environ.get('API_TOKEN_EXPIRATION') or 3600)
+    METRICS_ENABLED = os.environ.get('METRICS_DISABLED') is None
+    SLOW_QUERY_THRESHOLD = float(os.environ.get('SLOW_QUERY_THRESHOLD') or 0.5)
+    KEYSET_PAGINATION = os.environ.get('KEYSET_PAGINATION') is not None
+    COMPRESS_ENABLED = os.environ.get('COMPRESS_DISABLED') is None
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL') or 6)
+    COMPRESS_BROTLI_QUALITY = int(
+        os.environ.get('COMPRESS_BROTLI_QUALITY') or 4)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE') or 500)
+    COMPRESS_CACHE_SIZE = int(os.environ.get('COMPRESS_CACHE_SIZE') or 1000)
+    EVENTS_BROKER = os.environ.get('EVENTS_BROKER') or \
+        'app.events.LocalBroker'
+    EVENTS_QUEUE_SIZE = int(os.environ.get('EVENTS_QUEUE_SIZE') or 100)
+    EVENTS_MAX_CONNECTIONS = int(
+        os.environ.get('EVENTS_MAX_CONNECTIONS') or 100)
+    EVENTS_HEARTBEAT = int(os.environ.get('EVENTS_HEARTBEAT') or 15)
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE') or 10000)
+    LAST_SEEN_GRANULARITY = int(os.environ.get('LAST_SEEN_GRANULARITY') or 60)
+    LAST_SEEN_FLUSH_INTERVAL = int(
+        os.environ.get('LAST_SEEN_FLUSH_INTERVAL') or 10)
+    TIMELINE_MATERIALIZED = os.environ.get('TIMELINE_MATERIALIZED') is not None
+    TIMELINE_FANOUT_LIMIT = int(os.environ.get('TIMELINE_FANOUT_LIMIT') or 5000)
+    TIMELINE_HORIZON = int(os.environ.get('TIMELINE_HORIZON') or 30)
+    # SQLite allows at most 500 terms in a UNION ALL
+    TIMELINE_MERGE_AUTHORS = int(
+        os.environ.get('TIMELINE_MERGE_AUTHORS') or 400)
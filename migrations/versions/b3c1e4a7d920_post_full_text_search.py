@@ -0,0 +1,43 @@
+"""post full text search
+
+Revision ID: b3c1e4a7d920
+Revises: 27d8b51d5f6c
+Create Date: 2026-10-18 17:40:12.418230
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'b3c1e4a7d920'
+down_revision = '27d8b51d5f6c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE post_fts USING fts5("
+               "body, content='post', content_rowid='id')")
+    op.execute("CREATE TRIGGER post_fts_ai AFTER INSERT ON post BEGIN "
+               "INSERT INTO post_fts(rowid, body) "
+               "VALUES (new.id, new.body); END")
+    op.execute("CREATE TRIGGER post_fts_ad AFTER DELETE ON post BEGIN "
+               "INSERT INTO post_fts(post_fts, rowid, body) "
+               "VALUES ('delete', old.id, old.body); END")
+    op.execute("CREATE TRIGGER post_fts_au AFTER UPDATE ON post BEGIN "
+               "INSERT INTO post_fts(post_fts, rowid, body) "
+               "VALUES ('delete', old.id, old.body); "
+               "INSERT INTO post_fts(rowid, body) "
+               "VALUES (new.id, new.body); END")
+    op.execute("INSERT INTO post_fts(post_fts) VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TRIGGER post_fts_au')
+    op.execute('DROP TRIGGER post_fts_ad')
+    op.execute('DROP TRIGGER post_fts_ai')
+    op.execute('DROP TABLE post_fts')
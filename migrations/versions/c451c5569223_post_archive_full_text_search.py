@@ -0,0 +1,47 @@
+"""post archive full text search
+
+Revision ID: c451c5569223
+Revises: eb7b0321467c
+Create Date: 2026-10-18 18:40:05.118734
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = 'c451c5569223'
+down_revision = 'eb7b0321467c'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute("CREATE VIRTUAL TABLE post_archive_fts USING fts5("
+               "body, content='post_archive', content_rowid='id')")
+    op.execute("CREATE TRIGGER post_archive_fts_ai AFTER INSERT ON "
+               "post_archive BEGIN "
+               "INSERT INTO post_archive_fts(rowid, body) "
+               "VALUES (new.id, new.body); END")
+    op.execute("CREATE TRIGGER post_archive_fts_ad AFTER DELETE ON "
+               "post_archive BEGIN "
+               "INSERT INTO post_archive_fts(post_archive_fts, rowid, body) "
+               "VALUES ('delete', old.id, old.body); END")
+    op.execute("CREATE TRIGGER post_archive_fts_au AFTER UPDATE ON "
+               "post_archive BEGIN "
+               "INSERT INTO post_archive_fts(post_archive_fts, rowid, body) "
+               "VALUES ('delete', old.id, old.body); "
+               "INSERT INTO post_archive_fts(rowid, body) "
+               "VALUES (new.id, new.body); END")
+    op.execute("INSERT INTO post_archive_fts(post_archive_fts) "
+               "VALUES ('rebuild')")
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TRIGGER post_archive_fts_au')
+    op.execute('DROP TRIGGER post_archive_fts_ad')
+    op.execute('DROP TRIGGER post_archive_fts_ai')
+    op.execute('DROP TABLE post_archive_fts')
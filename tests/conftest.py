@@ -0,0 +1,21 @@
+import pytest
+from app import create_app, db
+from config import Config
+
+
+class TestConfig(Config):
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_BINDS = {}
+    PASSWORD_HASH_WORKERS = 0
+    METRICS_ENABLED = False
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
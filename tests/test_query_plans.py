@@ -0,0 +1,129 @@
+from datetime import datetime, timedelta, timezone
+import sqlalchemy as sa
+from app import db
+from app.models import User, Post, ArchivedPost
+from app.pagination import KeysetPagination
+from app.plans import PLAN_PROBLEM, check_plans, query_plan
+
+
+def add_users(count):
+    users = [User(username=f'user{i}', email=f'user{i}@example.com')
+             for i in range(count)]
+    db.session.add_all(users)
+    db.session.commit()
+    return users
+
+
+def add_posts(authors, count, model=Post, start=None):
+    """Gives each of `authors` `count` Posts, spread out in time.
+    ArchivedPosts keep the ids of their Posts, so they are numbered
+    after any Post"""
+    start = start or datetime.now(timezone.utc)
+    rows = [{'body': f'post {i}', 'user_id': author.id,
+             'timestamp': start - timedelta(minutes=i * len(authors) + j)}
+            for i in range(count) for j, author in enumerate(authors)]
+    if model is ArchivedPost:
+        first_id = db.session.scalar(sa.select(sa.func.max(Post.id))) or 0
+        for id, row in enumerate(rows, first_id + 1):
+            row['id'] = id
+    db.session.execute(sa.insert(model), rows)
+    db.session.execute(
+        sa.update(User).where(User.id.in_([author.id for author in authors]))
+        .values(num_posts=User.num_posts + count))
+    db.session.commit()
+
+
+def follow(user, authors):
+    user.follow_ids([author.id for author in authors])
+    db.session.commit()
+    db.session.refresh(user)
+
+
+def timeline_ids(user, plan, model=Post):
+    """Reads every page of the timeline by `plan`, returning the ids"""
+    query, keys = user.followed_posts(model, plan)
+    ids, cursor = [], None
+    while True:
+        page = KeysetPagination(query, keys, cursor, per_page=7)
+        ids.extend(post.id for post in page.items)
+        cursor = page.next_cursor
+        if cursor is None:
+            return ids
+
+
+def test_hot_queries_need_no_scan_or_sort(app):
+    user, *authors = add_users(4)
+    add_posts([user, *authors], 10)
+    add_posts(authors, 5, ArchivedPost,
+              datetime.now(timezone.utc) - timedelta(days=60))
+    follow(user, authors)
+    for name, plan, problems in check_plans(user):
+        assert not problems, (name, plan)
+
+
+def test_few_authors_are_merged(app):
+    user, *authors = add_users(6)
+    add_posts(authors, 20)
+    follow(user, authors[:3])
+    plan = user.timeline_plan()
+    assert plan == ('merge', [user.id] + [author.id for author in authors[:3]])
+    for model in (Post, ArchivedPost):
+        query, keys = user.followed_posts(model, plan)
+        for values in (None, (datetime.now(timezone.utc), 1)):
+            lines = query_plan(KeysetPagination.page_query(query, keys, values))
+            assert not [line for line in lines if PLAN_PROBLEM.search(line)]
+
+
+def test_merged_timeline_pages_in_order(app):
+    user, *authors = add_users(6)
+    add_posts(authors, 20)
+    follow(user, authors[:3])
+    expected = db.session.scalars(
+        sa.select(Post.id)
+        .where(Post.user_id.in_([author.id for author in authors[:3]]))
+        .order_by(Post.timestamp.desc(), Post.id.desc())).all()
+    assert timeline_ids(user, user.timeline_plan()) == expected
+    assert timeline_ids(user, ('walk', None)) == expected
+    assert timeline_ids(user, ('seek', None)) == expected
+
+
+def timeline_problems(user):
+    """Returns the problems `check_plans` reports, by query name"""
+    return {name: problems for name, plan, problems in check_plans(user)
+            if problems}
+
+
+def test_low_activity_authors_sort_is_reported(app):
+    app.config['TIMELINE_MERGE_AUTHORS'] = 2
+    user, *authors = add_users(10)
+    add_posts(authors[3:], 100)
+    add_posts(authors[:3], 1)
+    follow(user, authors[:3])
+    assert user.timeline_plan() == ('seek', None)
+    problems = timeline_problems(user)
+    assert sorted(problems) == [
+        'timeline (seek)', 'timeline (seek) (cursor)',
+        'timeline archive (seek)', 'timeline archive (seek) (cursor)']
+    for lines in problems.values():
+        assert 'USE TEMP B-TREE FOR ORDER BY' in lines
+
+
+def test_active_authors_walk_is_reported(app):
+    app.config['TIMELINE_MERGE_AUTHORS'] = 2
+    user, *authors = add_users(10)
+    add_posts(authors[3:], 1)
+    add_posts(authors[:3], 100)
+    follow(user, authors[:3])
+    assert user.timeline_plan() == ('walk', None)
+    problems = timeline_problems(user)
+    assert sorted(problems) == ['timeline (walk)', 'timeline archive (walk)']
+    for lines in problems.values():
+        assert [line for line in lines if line.startswith('SCAN ')]
+    # past a cursor the walk is a range of the (timestamp, id) index,
+    # which the plan shows as a SEARCH, so check for that index instead
+    for model in (Post, ArchivedPost):
+        query, keys = user.followed_posts(model, ('walk', None))
+        lines = query_plan(KeysetPagination.page_query(
+            query, keys, (datetime.now(timezone.utc), 1)))
+        assert f'ix_{model.__tablename__}_timestamp_id (timestamp<?)' in \
+            lines[0]